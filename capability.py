@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+测量值的向量化分析：过程能力（Cp/Cpk）与直方图
+
+一次性读取某部件号下所有数值型测量值，用 NumPy 按测量项名称分组，
+在一次向量化计算中得到每个测量项的均值、标准差、Cp、Cpk 和超规格 ppm；
+直方图同样在服务端用 NumPy 分桶，只返回桶边界和计数。
+"""
+
+import math
+
+import numpy as np
+
+
+def _to_array(texts):
+    """
+    将文本数值列表转换为 float 数组，无法转换的值记为 NaN
+    """
+    try:
+        return np.asarray(texts, dtype=float)
+    except (TypeError, ValueError):
+        result = np.empty(len(texts), dtype=float)
+        for idx, text in enumerate(texts):
+            try:
+                result[idx] = float(text)
+            except (TypeError, ValueError):
+                result[idx] = np.nan
+        return result
+
+
+def _json_number(value):
+    """
+    NaN/inf 转为 None，其余转为普通 float，便于 jsonify
+    """
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def compute_capability(rows):
+    """
+    计算每个测量项的过程能力
+
+    参数:
+    - rows: (name, result_value, lower_limit, upper_limit) 序列，按测量记录 id 升序
+
+    返回按名称排序的列表，每项包含 count/mean/sigma/lower_limit/upper_limit/
+    cp/cpk/out_of_spec_ppm。Cp/Cpk 使用每个测量项最新一条记录的上下限；
+    超规格 ppm 按每条记录自身的上下限判定。
+    """
+    if not rows:
+        return []
+
+    names, values, lowers, uppers = zip(*rows)
+    values = _to_array(values)
+    lowers = _to_array([limit or np.nan for limit in lowers])
+    uppers = _to_array([limit or np.nan for limit in uppers])
+
+    # 丢弃无法解析或非有限的测量值
+    valid = np.isfinite(values)
+    names = np.asarray(names, dtype=object)[valid]
+    values, lowers, uppers = values[valid], lowers[valid], uppers[valid]
+    if values.size == 0:
+        return []
+
+    unique_names, codes = np.unique(names.astype(str), return_inverse=True)
+    group_count = len(unique_names)
+
+    counts = np.bincount(codes, minlength=group_count)
+    means = np.bincount(codes, weights=values, minlength=group_count) / counts
+
+    # 两遍法计算样本标准差，避免平方和相减的舍入误差
+    deviations = values - means[codes]
+    squares = np.bincount(codes, weights=deviations * deviations, minlength=group_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigmas = np.sqrt(squares / (counts - 1))
+
+    # 每组最后一条记录的上下限作为当前规格
+    last_index = np.zeros(group_count, dtype=int)
+    np.maximum.at(last_index, codes, np.arange(codes.size))
+    lsl = lowers[last_index]
+    usl = uppers[last_index]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cp = (usl - lsl) / (6 * sigmas)
+        cpu = (usl - means) / (3 * sigmas)
+        cpl = (means - lsl) / (3 * sigmas)
+    # 只有单边规格时 Cpk 取存在的一侧
+    cpk = np.fmin(cpu, cpl)
+
+    out_of_spec = (values < lowers) | (values > uppers)
+    ppm = np.bincount(codes, weights=out_of_spec, minlength=group_count) / counts * 1e6
+
+    result = []
+    for idx, name in enumerate(unique_names):
+        result.append({
+            'name': str(name),
+            'count': int(counts[idx]),
+            'mean': _json_number(means[idx]),
+            'sigma': _json_number(sigmas[idx]),
+            'lower_limit': _json_number(lsl[idx]),
+            'upper_limit': _json_number(usl[idx]),
+            'cp': _json_number(cp[idx]),
+            'cpk': _json_number(cpk[idx]),
+            'out_of_spec_ppm': _json_number(ppm[idx]),
+        })
+    return result
+
+
+def compute_histogram(values, bins, lower_limit=None, upper_limit=None):
+    """
+    将测量值分桶
+
+    参数:
+    - values: 文本或数值形式的测量值序列
+    - bins: 分桶数量
+    - lower_limit / upper_limit: 上下限，分桶范围会扩展到覆盖上下限
+
+    返回 (edges, counts, min_value, max_value)，没有有效数值时返回 None
+    """
+    values = _to_array(list(values))
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+
+    min_value = float(values.min())
+    max_value = float(values.max())
+    low, high = min_value, max_value
+    for limit in (lower_limit, upper_limit):
+        if limit is not None and math.isfinite(limit):
+            low = min(low, limit)
+            high = max(high, limit)
+    if low == high:
+        # 所有值相同时给出一个单位宽度的范围
+        low, high = low - 0.5, high + 0.5
+
+    counts, edges = np.histogram(values, bins=bins, range=(low, high))
+    return edges.tolist(), counts.tolist(), min_value, max_value
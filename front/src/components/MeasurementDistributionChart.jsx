@@ -2,34 +2,23 @@ import React from 'react';
 import ReactECharts from 'echarts-for-react';
 
 /**
- * 测量数据分布图组件
+ * 测量数据分布图组件（分桶由后端 /api/measurements/histogram 完成）
  * @param {Object} props
  * @param {string} props.name 测试项名称
- * @param {number[]} props.values 测量值数组
+ * @param {number[]} props.edges 桶边界（长度为桶数 + 1）
+ * @param {number[]} props.counts 每个桶的计数
  * @param {string} [props.unit] 单位
  */
 // 支持 upperLimit/lowerLimit 参考线
-export default function MeasurementDistributionChart({ name, values, unit, upperLimit, lowerLimit }) {
-  if (!values || values.length === 0) return null;
-  // 让分布更细腻：分桶数量更多
-  const binCount = Math.max(30, Math.floor(values.length / 2), Math.ceil(Math.sqrt(values.length)));
-  const finalBinCount = Math.min(binCount, 100); // 最多100个分桶，防止过细
-  // 动态确定X轴范围，覆盖所有值和上下限
-  let min = Math.min(...values);
-  let max = Math.max(...values);
-  if (typeof lowerLimit === 'number') min = Math.min(min, lowerLimit);
-  if (typeof upperLimit === 'number') max = Math.max(max, upperLimit);
-  const binWidth = (max - min) / finalBinCount;
+export default function MeasurementDistributionChart({ name, edges, counts, unit, upperLimit, lowerLimit }) {
+  if (!edges || !counts || counts.length === 0) return null;
+  // X轴范围由后端给出的桶边界决定（已覆盖所有值和上下限）
+  const min = edges[0];
+  const max = edges[edges.length - 1];
+  const binWidth = edges[1] - edges[0];
   // 计算每个bin的中心点用于value型x轴
-  const binCenters = Array(finalBinCount).fill(0).map((_, i) => min + (i + 0.5) * binWidth);
-  const bins = Array(finalBinCount).fill(0);
-  values.forEach(v => {
-    if (isNaN(v)) return;
-    let idx = Math.floor((v - min) / binWidth);
-    if (idx >= finalBinCount) idx = finalBinCount - 1;
-    if (idx < 0) idx = 0;
-    bins[idx]++;
-  });
+  const binCenters = counts.map((_, i) => (edges[i] + edges[i + 1]) / 2);
+  const bins = counts;
 
   // 构造 markLine（上限/下限竖线，X轴直接用数值）
   const markLines = [];
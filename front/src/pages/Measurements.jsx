@@ -11,6 +11,7 @@ export default function Measurements() {
   const [showSuggestions, setShowSuggestions] = useState(false);
   const debounceRef = React.useRef();
   const [measurements, setMeasurements] = useState([]);
+  const [histogram, setHistogram] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   
@@ -93,6 +94,7 @@ export default function Measurements() {
   useEffect(() => {
     if (!selectedName) {
       setMeasurements([]);
+      setHistogram(null);
       return;
     }
     async function fetchMeasurements() {
@@ -106,7 +108,23 @@ export default function Measurements() {
           params.part_number = selectedPartNumber;
         }
         
-        const data = await apiService.getMeasurements(params);
+        // 明细表格只取一页，直方图由后端按全部数据分桶
+        // 总数使用后端缓存（直到下一次导入），翻页时不再每次全表计数
+        // 直方图请求失败时只隐藏图表，不影响表格
+        const [dataResult, histResult] = await Promise.allSettled([
+          apiService.getMeasurements({ ...params, count: 'cached' }),
+          apiService.getMeasurementHistogram(params),
+        ]);
+        if (histResult.status === 'fulfilled') {
+          setHistogram(histResult.value);
+        } else {
+          console.error('获取直方图数据错误:', histResult.reason);
+          setHistogram(null);
+        }
+        if (dataResult.status === 'rejected') {
+          throw dataResult.reason;
+        }
+        const data = dataResult.value;
         const arr = Array.isArray(data?.measurements) ? data.measurements : [];
         setMeasurements(arr);
       } catch (err) {
@@ -222,29 +240,16 @@ export default function Measurements() {
       {selectedName && measurements.length > 0 && (
         <React.Fragment>
           {/* 数值型“值”分布直方图，自动标注上限/下限 */}
-          {(() => {
-            const values = measurements.map(m => Number(m.result_value)).filter(v => !Number.isNaN(v));
-            if (values.length > 1) {
-              // 取单位
-              const unit = measurements.find(m => m.unit_of_measure)?.unit_of_measure || '';
-              // 判断所有上限/下限是否一致且为有效数值
-              let upperLimit, lowerLimit;
-              const uppers = measurements.map(m => Number(m.upper_limit)).filter(v => !Number.isNaN(v));
-              const lowers = measurements.map(m => Number(m.lower_limit)).filter(v => !Number.isNaN(v));
-              if (uppers.length > 0 && uppers.every(v => v === uppers[0])) upperLimit = uppers[0];
-              if (lowers.length > 0 && lowers.every(v => v === lowers[0])) lowerLimit = lowers[0];
-              return (
-                <MeasurementDistributionChart
-                  name={selectedName + ' 值'}
-                  values={values}
-                  unit={unit}
-                  upperLimit={upperLimit}
-                  lowerLimit={lowerLimit}
-                />
-              );
-            }
-            return null;
-          })()}
+          {histogram && histogram.count > 1 && (
+            <MeasurementDistributionChart
+              name={selectedName + ' 值'}
+              edges={histogram.edges}
+              counts={histogram.counts}
+              unit={histogram.unit_of_measure || ''}
+              upperLimit={histogram.upper_limit ?? undefined}
+              lowerLimit={histogram.lower_limit ?? undefined}
+            />
+          )}
 
           <table className="min-w-full border mt-4">
           <thead>
@@ -15,27 +15,32 @@ export default function useDailyYield(recentDates) {
     }
     let cancelled = false;
     async function fetchStats() {
+      // 一次请求取回整个日期范围的良率，由后端汇总表计算
+      const sorted = [...recentDates].sort();
       const stats = {};
+      // 后端返回 YYYYMMDD 格式的日期
+      const keys = {};
       for (const date of recentDates) {
-        try {
-          // 只获取当天的报告（确保后端支持 ?date=YYYYMMDD 过滤）
-          const reports = await apiService.getReports({ date });
-          let pass = 0;
-          let fail = 0;
-          for (const r of reports) {
-            if (r.result === 'Pass') pass++;
-            else fail++;
-          }
-          const total = pass + fail;
+        stats[date] = { pass: 0, fail: 0, total: 0, yield: '0' };
+        keys[String(date).replace(/-/g, '')] = date;
+      }
+      try {
+        const rows = await apiService.getDailyYield({
+          start_date: sorted[0],
+          end_date: sorted[sorted.length - 1],
+        });
+        for (const row of rows) {
+          const date = keys[row.date];
+          if (date === undefined) continue;
           stats[date] = {
-            pass,
-            fail,
-            total,
-            yield: total > 0 ? ((pass / total) * 100).toFixed(1) : '0',
+            pass: row.pass,
+            fail: row.fail,
+            total: row.total,
+            yield: row.total > 0 ? ((row.pass / row.total) * 100).toFixed(1) : '0',
           };
-        } catch (e) {
-          stats[date] = { pass: 0, fail: 0, total: 0, yield: '0' };
         }
+      } catch (e) {
+        console.error('获取每日良率统计出错:', e);
       }
       if (!cancelled) setDailyStats(stats);
     }
@@ -52,6 +52,30 @@ const apiService = {
     }
   },
 
+  // 按序列号/部件号/测试工位/文件名快速查找报告
+  // params: { q, field, limit }
+  lookupReports: async (params = {}) => {
+    try {
+      const response = await apiClient.get('/api/reports/lookup', { params });
+      return response.data;
+    } catch (error) {
+      console.error('查找报告出错:', error);
+      throw error;
+    }
+  },
+
+  // 批量获取报告详情（多台产品对比）
+  // options: { fields, names, include_test_info }
+  getReportsBatch: async (reportIds, options = {}) => {
+    try {
+      const response = await apiClient.post('/api/reports/batch', { report_ids: reportIds, ...options });
+      return response.data;
+    } catch (error) {
+      console.error('批量获取报告详情出错:', error);
+      throw error;
+    }
+  },
+
   // 获取结果统计
   getResultStatistics: async () => {
     try {
@@ -75,9 +99,10 @@ const apiService = {
   },
 
   // 获取每日良率统计
-  getDailyYield: async () => {
+  // params: { start_date, end_date, group_by, part_number, tester_id, test_sub }
+  getDailyYield: async (params = {}) => {
     try {
-      const response = await apiClient.get('/api/statistics/daily-yield');
+      const response = await apiClient.get('/api/statistics/daily-yield', { params });
       return response.data;
     } catch (error) {
       console.error('获取每日良率统计出错:', error);
@@ -85,10 +110,37 @@ const apiService = {
     }
   },
 
-  // 获取TOP10不良测试项
-  getTopFailMeasurements: async () => {
+  // 多维良率切片：params 为 { group_by, start_date, end_date, <维度名>: 取值或取值数组 }
+  getYieldCube: async (params = {}) => {
+    try {
+      const response = await apiClient.get('/api/statistics/yield-cube', {
+        params,
+        // 数组参数按 part_number=a&part_number=b 传递
+        paramsSerializer: { indexes: null },
+      });
+      return response.data;
+    } catch (error) {
+      console.error('获取多维良率统计出错:', error);
+      throw error;
+    }
+  },
+
+  // 通用查询：spec 为 JSON 查询描述 { from, select, where, group_by, aggregates, order_by, limit, offset }
+  runQuery: async (spec) => {
     try {
-      const response = await apiClient.get('/api/statistics/top-fail-measurements');
+      const response = await apiClient.post('/api/query', spec);
+      return response.data;
+    } catch (error) {
+      console.error('通用查询出错:', error);
+      throw error;
+    }
+  },
+
+  // 获取TOP N不良测试项
+  // params: { limit, start_date, end_date, days, part_number, tester_id }，默认全部时间TOP10
+  getTopFailMeasurements: async (params = {}) => {
+    try {
+      const response = await apiClient.get('/api/statistics/top-fail-measurements', { params });
       return response.data;
     } catch (error) {
       console.error('获取TOP不良测试项出错:', error);
@@ -131,6 +183,29 @@ const apiService = {
     }
   },
 
+  // 获取测量值直方图（服务端分桶）
+  getMeasurementHistogram: async (params = {}) => {
+    try {
+      const response = await apiClient.get('/api/measurements/histogram', { params });
+      return response.data;
+    } catch (error) {
+      console.error('获取测量值直方图出错:', error);
+      throw error;
+    }
+  },
+
+  // 获取筛选下拉框所需的维度取值（部件号、工位、站点、测试规范、日期、测试项名称）
+  // params: { kind, part_number }
+  getCatalog: async (params = {}) => {
+    try {
+      const response = await apiClient.get('/api/catalog', { params });
+      return response.data;
+    } catch (error) {
+      console.error('获取目录数据出错:', error);
+      throw error;
+    }
+  },
+
   // 获取所有测试项名称
   getMeasurementNames: async (q = '') => {
     try {
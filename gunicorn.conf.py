@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+gunicorn 配置（生产环境）
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+通过环境变量调整：
+    API_BIND: 监听地址，默认 0.0.0.0:5000
+    API_WORKERS: 工作进程数，默认 CPU 核数 * 2 + 1（最多 8）
+    API_THREADS: 每个工作进程的线程数，默认 4
+    API_TIMEOUT: 单个请求的超时时间（秒），默认 120
+    API_MAX_REQUESTS: 工作进程处理多少个请求后平滑重启，默认 5000（0 表示不重启）
+
+平滑重启：
+    kill -HUP <主进程PID>    按新配置重启全部工作进程，处理中的请求会先完成
+    代码更新后（preload 模式下 HUP 不会重新导入代码）：
+    kill -USR2 <主进程PID>   启动加载新代码的主进程
+    kill -QUIT <旧主进程PID> 新主进程就绪后让旧主进程处理完请求后退出
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('API_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('API_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('API_THREADS', 4))
+# 多线程工作进程：同一进程内的线程共享进程内结果缓存和输入提示索引
+worker_class = 'gthread'
+
+# 主进程中导入应用并准备数据库（见 wsgi.py），工作进程直接 fork，启动快且只初始化一次
+preload_app = True
+
+timeout = int(os.environ.get('API_TIMEOUT', 120))
+# 平滑重启/停止时等待处理中请求完成的时间（秒）
+graceful_timeout = 30
+keepalive = 5
+
+# 定期替换工作进程，避免长期运行的内存增长；加随机抖动，避免所有进程同时重启
+max_requests = int(os.environ.get('API_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('API_LOG_LEVEL', 'info')
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+API 负载测试：多个客户端进程并发请求一组接口，统计吞吐量（请求/秒）和延迟分位数
+
+用法：
+    python load_benchmark.py --url http://localhost:5000 --clients 16 --duration 20
+
+可选参数：
+    --url URL: 服务地址，默认 http://localhost:5000
+    --clients N: 并发客户端数（每个客户端一个进程，保持长连接顺序发送请求），默认 16
+    --duration S: 测试时长（秒），默认 20
+    --path PATH: 请求的路径，可重复指定；默认为仪表盘常用的一组接口
+
+对比开发服务器与生产模式时，分别启动后用相同参数运行：
+    python simple_api_server.py
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import time
+from urllib.parse import urlsplit
+
+# 默认请求的接口（仪表盘加载时的典型请求）
+DEFAULT_PATHS = (
+    '/api/status',
+    '/api/statistics/results',
+    '/api/statistics/daily-yield',
+    '/api/statistics/top-fail-measurements',
+    '/api/catalog?kind=part_numbers,testers',
+    '/api/measurements/names?q=TX',
+    '/api/reports?limit=20',
+    '/api/measurements?limit=50',
+)
+
+
+def _client(url, paths, duration, offset, results):
+    """
+    单个客户端：在 duration 秒内循环请求 paths，记录每个请求的延迟和失败数
+    """
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    latencies = []
+    errors = 0
+    index = offset
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+            # 服务端关闭连接（如开发服务器不保持长连接）时重新连接
+            if response.will_close:
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    results.put((latencies, errors))
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[index]
+
+
+def run(url, clients, duration, paths):
+    """
+    运行负载测试并返回统计结果
+    """
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_client, args=(url, paths, duration, i, results))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    latencies = []
+    errors = 0
+    for _ in workers:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed': round(elapsed, 2),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API 负载测试')
+    parser.add_argument('--url', default='http://localhost:5000', help='服务地址')
+    parser.add_argument('--clients', type=int, default=16, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=20, help='测试时长（秒）')
+    parser.add_argument('--path', action='append', dest='paths', help='请求的路径，可重复指定')
+    args = parser.parse_args()
+
+    paths = args.paths or list(DEFAULT_PATHS)
+    print(f'{args.url}: {args.clients} 个客户端，{args.duration} 秒，{len(paths)} 个接口')
+    stats = run(args.url, args.clients, args.duration, paths)
+    print(f"请求数: {stats['requests']}，失败: {stats['errors']}，耗时: {stats['elapsed']} 秒")
+    print(f"吞吐量: {stats['rps']} 请求/秒")
+    print(f"延迟: p50 {stats['p50_ms']} ms，p95 {stats['p95_ms']} ms，p99 {stats['p99_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
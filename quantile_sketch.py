@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+可合并的流式分位数草图（KLL sketch）
+
+参考 Karnin, Lang, Liberty, "Optimal Quantile Approximation in Streams" (2016)。
+草图只保留约 k / (1 - c) 个样本（k=200 时不超过约 600 个），与数据总量无关；
+两个草图可以直接合并，因此入库时只需把单份报告的草图合并进数据库中已保存的草图。
+
+误差界：
+- 样本数不超过 k 时不做压缩，分位数结果是精确值；
+- 超过后，返回值的排名误差（rank error）约为 ±1.65%（k=200，99% 置信度），
+  即查询 p50 时返回值在全体数据中的真实排名落在 48.35%～51.65% 之间；
+- 最小值、最大值（p0 / p100）始终精确。
+"""
+
+import json
+import math
+import random
+
+# 默认精度参数，误差约与 1/k 成正比
+DEFAULT_K = 200
+
+# 每下降一层容量缩小的比例
+CAPACITY_DECAY = 2 / 3
+
+
+def rank_error(k=DEFAULT_K):
+    """
+    返回参数 k 对应的近似排名误差（99% 置信度，比例值）
+    """
+    return 1.65 * DEFAULT_K / k / 100
+
+
+class KLLSketch:
+    """
+    KLL 分位数草图，第 h 层中的每个样本代表 2**h 个原始值
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.count = 0
+        self.min_value = None
+        self.max_value = None
+        self.levels = [[]]
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return int(math.ceil(self.k * CAPACITY_DECAY ** depth)) + 1
+
+    def _retained(self):
+        return sum(len(items) for items in self.levels)
+
+    def _max_retained(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value):
+        """
+        加入一个数值
+        """
+        value = float(value)
+        self.count += 1
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+        self.levels[0].append(value)
+        if self._retained() >= self._max_retained():
+            self._compress()
+
+    def merge(self, other):
+        """
+        将另一个草图合并进来（原地修改并返回自身）
+        """
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        if self.min_value is None or other.min_value < self.min_value:
+            self.min_value = other.min_value
+        if self.max_value is None or other.max_value > self.max_value:
+            self.max_value = other.max_value
+        while self._retained() >= self._max_retained():
+            self._compress()
+        return self
+
+    def _compress(self):
+        for level in range(len(self.levels)):
+            items = self.levels[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            # 排序后随机保留奇数位或偶数位的样本，提升到上一层（权重翻倍）
+            items.sort()
+            leftover = [items.pop()] if len(items) % 2 else []
+            offset = random.randint(0, 1)
+            self.levels[level + 1].extend(items[offset::2])
+            self.levels[level] = leftover
+            if self._retained() < self._max_retained():
+                break
+
+    def is_exact(self):
+        """
+        尚未发生压缩时（所有样本权重为 1），分位数结果是精确值
+        """
+        return not any(self.levels[1:])
+
+    def quantile(self, q):
+        """
+        返回分位数 q（0～1）对应的近似值，草图为空时返回 None
+        """
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min_value
+        if q >= 1:
+            return self.max_value
+
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.levels)
+            for value in items
+        )
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return self.max_value
+
+    def to_json(self):
+        """
+        序列化为 JSON 文本，便于存入数据库
+        """
+        return json.dumps({
+            'k': self.k,
+            'count': self.count,
+            'min': self.min_value,
+            'max': self.max_value,
+            'levels': self.levels,
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        """
+        从 to_json 的结果恢复草图
+        """
+        data = json.loads(text)
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        sketch.min_value = data['min']
+        sketch.max_value = data['max']
+        sketch.levels = data['levels'] or [[]]
+        return sketch
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+"""
+JSON 查询描述（DSL）编译为参数化 SQL
+
+在 test_reports / test_info / measurements 三张明细表上支持过滤、投影、分组、聚合、
+排序和分页，字段名、运算符和聚合函数都来自白名单，取值一律作为参数绑定，不拼接用户输入。
+
+查询描述示例：
+
+    {
+        "from": "measurements",
+        "where": [
+            {"field": "name", "op": "=", "value": "TX1_EVM"},
+            {"field": "reports.date", "op": "between", "value": ["20250201", "20250228"]}
+        ],
+        "group_by": ["reports.part_number"],
+        "aggregates": [{"fn": "count", "as": "n"}, {"fn": "avg", "field": "result_value", "as": "mean"}],
+        "order_by": [{"field": "n", "dir": "desc"}],
+        "limit": 20
+    }
+
+字段写作 “表名.列名”，省略表名时为 from 指定的表；引用其它表的字段时自动按报告ID连接。
+编译后用 EXPLAIN QUERY PLAN 检查执行计划：需要全表扫描且该表行数超过上限的查询被拒绝。
+"""
+
+import math
+import re
+
+from search_index import prefix_upper_bound
+
+# 表名 -> (SQL 表名, 别名, 报告ID列, 可用列)
+TABLES = {
+    'reports': ('test_reports', 'r', 'id', (
+        'id', 'filename', 'serial_number', 'part_number', 'tester_id', 'test_sub', 'date', 'time', 'result',
+    )),
+    'test_info': ('test_info', 't', 'report_id', (
+        'id', 'report_id', 'file_name', 'swift_version', 'test_spec_id', 'operator_id',
+        'tester_serial_number', 'tester_ot_number', 'tester_sw_version', 'tester_hw_version',
+        'tester_site', 'tester_operation', 'dut_serial_number', 'dut_product_code',
+        'dut_product_revision', 'custom_attributes', 'setup_time', 'test_time', 'unload_time',
+        'test_start', 'test_stop', 'overall_status', 'diagnostics_type', 'diagnostics_value',
+    )),
+    'measurements': ('measurements', 'm', 'report_id', (
+        'id', 'report_id', 'measurement_id', 'step_type', 'name', 'result_type', 'result_value',
+        'status', 'unit_of_measure', 'lower_limit', 'upper_limit', 'test_time', 'comment', 'qm_meas_id',
+    )),
+}
+
+# 以 TEXT 存储的数值列（表名 -> 列）：范围比较和 min/max 按数值而不是按字符串比较
+NUMERIC_FIELDS = {
+    'test_info': ('setup_time', 'test_time', 'unload_time'),
+    'measurements': ('result_value', 'lower_limit', 'upper_limit', 'test_time'),
+}
+
+# 数值列的比较表达式；空字符串视为空值
+NUMERIC_EXPRESSION = "CAST(NULLIF({}, '') AS REAL)"
+
+# 按数值比较的运算符
+RANGE_OPERATORS = ('<', '<=', '>', '>=', 'between')
+
+# 比较运算符 -> SQL
+COMPARISONS = {'=': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+# 其它运算符：in / not_in（取值为列表）、between（两个取值）、prefix（前缀匹配，可用索引）、
+# contains（子串匹配，需要扫描）、is_null / not_null（无取值）
+OPERATORS = tuple(COMPARISONS) + ('in', 'not_in', 'between', 'prefix', 'contains', 'is_null', 'not_null')
+
+# 聚合函数；count 可不指定字段，sum/avg 按数值计算
+AGGREGATES = {
+    'count': 'COUNT({})',
+    'count_distinct': 'COUNT(DISTINCT {})',
+    'sum': 'SUM(CAST({} AS REAL))',
+    'avg': 'AVG(CAST({} AS REAL))',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+}
+
+# in / not_in 最多的取值个数
+MAX_IN_VALUES = 1000
+
+# 输出列名（别名）格式
+ALIAS_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+
+# 执行计划中的全表（全索引）扫描，如 "SCAN m"、"SCAN measurements USING COVERING INDEX ..."
+# （旧版本为 "SCAN TABLE measurements AS m"），捕获别名或表名
+SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE \w+ AS )?(?:TABLE )?(\w+)')
+
+
+class QuerySpecError(ValueError):
+    """
+    查询描述无效或执行代价超出限制
+    """
+
+
+class CompiledQuery:
+    """
+    编译结果：SQL、参数和输出列名
+    """
+
+    def __init__(self, sql, params, columns):
+        self.sql = sql
+        self.params = params
+        self.columns = columns
+
+
+class _Compiler:
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise QuerySpecError('查询描述必须是 JSON 对象')
+        self.spec = spec
+        self.base = spec.get('from', 'measurements')
+        if self.base not in TABLES:
+            raise QuerySpecError(f"from 必须是 {', '.join(TABLES)} 之一")
+        # 用到的表，按首次引用顺序连接
+        self.tables = [self.base]
+
+    def field(self, ref):
+        """
+        解析字段引用，返回 SQL 列表达式
+        """
+        if not isinstance(ref, str) or not ref:
+            raise QuerySpecError('字段必须是非空字符串')
+        table, _, column = ref.rpartition('.')
+        table = table or self.base
+        if table not in TABLES:
+            raise QuerySpecError(f'未知的表: {table}')
+        _, alias, _, columns = TABLES[table]
+        if column not in columns:
+            raise QuerySpecError(f'未知的字段: {ref}')
+        if table not in self.tables:
+            self.tables.append(table)
+        return f'{alias}.{column}'
+
+    def is_numeric(self, ref):
+        """
+        字段是否为以 TEXT 存储的数值列（ref 须已通过 field 校验）
+        """
+        table, _, column = ref.rpartition('.')
+        return column in NUMERIC_FIELDS.get(table or self.base, ())
+
+    def condition(self, clause, params):
+        if not isinstance(clause, dict):
+            raise QuerySpecError('where 中的每个条件必须是对象')
+        column = self.field(clause.get('field'))
+        op = clause.get('op', '=')
+        value = clause.get('value')
+        if op not in OPERATORS:
+            raise QuerySpecError(f"op 必须是 {', '.join(OPERATORS)} 之一")
+        # 数值列与数字做范围比较时按数值比较（否则 '10' < '9'）
+        values = value if op == 'between' and isinstance(value, list) else [value]
+        if (op in RANGE_OPERATORS and self.is_numeric(clause['field'])
+                and all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in values)):
+            column = NUMERIC_EXPRESSION.format(column)
+        if op in ('is_null', 'not_null'):
+            return f"{column} IS {'NOT ' if op == 'not_null' else ''}NULL"
+        if op in ('in', 'not_in'):
+            if not isinstance(value, list) or not value or len(value) > MAX_IN_VALUES:
+                raise QuerySpecError(f'{op} 的取值必须是 1 到 {MAX_IN_VALUES} 个元素的列表')
+            self._check_scalars(value)
+            params.extend(value)
+            return f"{column} {'NOT IN' if op == 'not_in' else 'IN'} ({', '.join('?' * len(value))})"
+        if op == 'between':
+            if not isinstance(value, list) or len(value) != 2:
+                raise QuerySpecError('between 的取值必须是两个元素的列表')
+            self._check_scalars(value)
+            params.extend(value)
+            return f'{column} BETWEEN ? AND ?'
+        self._check_scalars([value])
+        if value is None:
+            raise QuerySpecError(f'{op} 需要 value，判断空值请使用 is_null / not_null')
+        if op == 'prefix':
+            # 用范围比较代替 LIKE，前缀匹配可以使用 B-tree 索引
+            text = str(value)
+            if not text:
+                raise QuerySpecError('prefix 的取值不能为空')
+            upper = prefix_upper_bound(text)
+            if upper is None:
+                params.append(text)
+                return f'{column} >= ?'
+            params.extend([text, upper])
+            return f'({column} >= ? AND {column} < ?)'
+        if op == 'contains':
+            text = str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{text}%')
+            return f"{column} LIKE ? ESCAPE '\\'"
+        params.append(value)
+        return f'{column} {COMPARISONS[op]} ?'
+
+    @staticmethod
+    def _check_scalars(values):
+        for value in values:
+            if isinstance(value, (dict, list)):
+                raise QuerySpecError('条件取值必须是字符串、数字或 null')
+
+    def _list(self, key):
+        value = self.spec.get(key) or []
+        if not isinstance(value, list):
+            raise QuerySpecError(f'{key} 必须是列表')
+        return value
+
+    def compile(self, max_limit):
+        params = []
+        where = [self.condition(clause, params) for clause in self._list('where')]
+
+        outputs = []    # (输出列名, SQL 表达式)
+        group_by = self._list('group_by')
+        aggregates = self._list('aggregates')
+        if group_by or aggregates:
+            if self._list('select'):
+                raise QuerySpecError('使用 group_by / aggregates 时不能同时指定 select')
+            group_columns = []
+            for ref in group_by:
+                column = self.field(ref)
+                group_columns.append(column)
+                outputs.append((ref, column))
+            for aggregate in aggregates:
+                if not isinstance(aggregate, dict) or aggregate.get('fn') not in AGGREGATES:
+                    raise QuerySpecError(f"aggregates 的 fn 必须是 {', '.join(AGGREGATES)} 之一")
+                fn = aggregate['fn']
+                ref = aggregate.get('field')
+                if ref is None and fn != 'count':
+                    raise QuerySpecError(f'{fn} 需要指定 field')
+                argument = self.field(ref) if ref is not None else '*'
+                if fn in ('min', 'max') and self.is_numeric(ref):
+                    argument = NUMERIC_EXPRESSION.format(argument)
+                name = aggregate.get('as') or (f'{fn}_{ref.replace(".", "_")}' if ref else fn)
+                if not ALIAS_PATTERN.match(name):
+                    raise QuerySpecError(f'无效的输出列名: {name}')
+                outputs.append((name, AGGREGATES[fn].format(argument)))
+        else:
+            group_columns = []
+            select = self._list('select') or list(TABLES[self.base][3])
+            for ref in select:
+                outputs.append((ref, self.field(ref)))
+
+        names = [name for name, _ in outputs]
+        if len(set(names)) != len(names):
+            raise QuerySpecError('输出列名重复')
+
+        order = []
+        for item in self._list('order_by'):
+            if isinstance(item, str):
+                item = {'field': item}
+            if not isinstance(item, dict):
+                raise QuerySpecError('order_by 中的每项必须是字段名或对象')
+            direction = str(item.get('dir', 'asc')).lower()
+            if direction not in ('asc', 'desc'):
+                raise QuerySpecError('dir 必须是 asc 或 desc')
+            ref = item.get('field')
+            if ref in names:
+                expression = f'"{ref}"'
+            elif group_columns:
+                raise QuerySpecError(f'分组查询只能按输出列排序: {ref}')
+            else:
+                expression = self.field(ref)
+            # 数值列按数值排序
+            if isinstance(ref, str) and self.is_numeric(ref):
+                expression = NUMERIC_EXPRESSION.format(expression)
+            order.append(f'{expression} {direction.upper()}')
+
+        limit = self.spec.get('limit', 100)
+        offset = self.spec.get('offset', 0)
+        if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= max_limit:
+            raise QuerySpecError(f'limit 必须在 1 到 {max_limit} 之间')
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise QuerySpecError('offset 必须是非负整数')
+
+        base_table, base_alias, base_key, _ = TABLES[self.base]
+        sql = [
+            'SELECT ' + ', '.join(f'{expression} AS "{name}"' for name, expression in outputs),
+            f'FROM {base_table} {base_alias}',
+        ]
+        for table in self.tables[1:]:
+            sql_table, alias, key, _ = TABLES[table]
+            sql.append(f'JOIN {sql_table} {alias} ON {alias}.{key} = {base_alias}.{base_key}')
+        if where:
+            sql.append('WHERE ' + ' AND '.join(where))
+        if group_columns:
+            sql.append('GROUP BY ' + ', '.join(group_columns))
+        if order:
+            sql.append('ORDER BY ' + ', '.join(order))
+        sql.append('LIMIT ? OFFSET ?')
+        params.extend([limit, offset])
+        return CompiledQuery('\n'.join(sql), params, names)
+
+
+def compile_query(spec, max_limit=10000):
+    """
+    编译查询描述，返回 CompiledQuery；描述无效时抛出 QuerySpecError
+    """
+    return _Compiler(spec).compile(max_limit)
+
+
+def query_plan(cursor, compiled):
+    """
+    返回执行计划各步骤的说明文字
+    """
+    cursor.execute('EXPLAIN QUERY PLAN ' + compiled.sql, compiled.params)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def check_plan(cursor, plan, max_scan_rows):
+    """
+    检查执行计划中的全表（全索引）扫描：被扫描表的行数超过 max_scan_rows 时抛出 QuerySpecError。
+    行数按 MAX(rowid) 估计，只读取 B-tree 的最后一页
+    """
+    tables = {}
+    for sql_table, alias, _, _ in TABLES.values():
+        tables[alias] = tables[sql_table] = sql_table
+    for detail in plan:
+        match = SCAN_PATTERN.match(detail)
+        if not match or match.group(1) not in tables:
+            continue
+        table = tables[match.group(1)]
+        cursor.execute(f'SELECT MAX(rowid) FROM {table}')
+        rows = cursor.fetchone()[0] or 0
+        if rows > max_scan_rows:
+            raise QuerySpecError(
+                f'查询需要扫描 {table} 全表（约 {rows} 行，上限 {max_scan_rows} 行），'
+                f'请增加可使用索引的过滤条件（执行计划: {detail}）'
+            )
+
+
+def run_query(cursor, spec, max_scan_rows, max_limit=10000):
+    """
+    编译、检查并执行查询，返回 {'columns', 'total', 'results'}；
+    spec 中 explain 为 true 时只返回 SQL、参数、执行计划和检查结果（rejected），不执行
+    """
+    compiled = compile_query(spec, max_limit)
+    plan = query_plan(cursor, compiled)
+    if spec.get('explain'):
+        try:
+            check_plan(cursor, plan, max_scan_rows)
+            rejected = None
+        except QuerySpecError as e:
+            rejected = str(e)
+        return {'sql': compiled.sql, 'params': compiled.params, 'plan': plan, 'rejected': rejected}
+    check_plan(cursor, plan, max_scan_rows)
+    cursor.execute(compiled.sql, compiled.params)
+    # 聚合溢出得到的 inf/nan 无法用 JSON 表示，返回 null
+    results = [
+        dict(zip(compiled.columns, (
+            None if isinstance(value, float) and not math.isfinite(value) else value for value in row
+        )))
+        for row in cursor.fetchall()
+    ]
+    return {'columns': compiled.columns, 'total': len(results), 'results': results}
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+
+"""
+结果缓存：进程内缓存（ResultCache）和多进程共享缓存（SharedResultCache）
+
+按“接口 + 规范化查询参数”缓存只读接口的计算结果：
+- 按字节数限制总大小，超出时淘汰最久未使用（LRU）的条目；
+- 每个条目有存活时间（TTL），过期后重新计算；
+- 每个条目记录写入时的数据代数（rollup_meta.generation），导入新报告的事务
+  提交后代数加 1，旧条目随即失效，因此不会返回导入前的结果；
+- 统计命中、未命中、淘汰等计数，便于观察缓存效果。
+
+多个工作进程部署时，SharedResultCache 把结果存放在同一主机共享的 SQLite 文件中，
+并用锁记录实现单飞计算，同一数据代数下每个结果在每台主机上只计算一次。
+
+RequestCoalescer 在进程内合并相同的并发请求：同一时刻相同键的计算只执行一次，
+其余线程等待并共享其结果，不缓存结果。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# 默认缓存总大小上限（字节）
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# 默认条目存活时间（秒）
+DEFAULT_TTL = 300
+
+
+def estimate_size(value):
+    """
+    估算缓存值占用的字节数：bytes 取长度，其余按 JSON 序列化后的长度计算
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return len(json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'))
+
+
+class ResultCache:
+    """
+    线程安全的 LRU 结果缓存，按字节数限制大小，带 TTL 和数据代数失效
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (数据代数, 过期时间, 字节数, 值)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def _sync_generation(self, generation):
+        """
+        数据代数比已见过的最新代数大时说明有新数据提交，整体清空旧条目；
+        返回 generation 是否为最新代数（并发请求可能仍带着提交前读到的旧代数，
+        这样的读写按未命中处理，不清空缓存）
+        """
+        if self._generation is not None and generation < self._generation:
+            return False
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+        return True
+
+    def get(self, key, generation):
+        """
+        返回缓存值；不存在、已过期、数据代数已变化或早于最新代数时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key) if self._sync_generation(generation) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key, generation, value, size=None):
+        """
+        写入缓存值；单个值超过总大小上限或数据代数早于最新代数时不缓存
+        """
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._sync_generation(generation):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (generation, self._clock() + self.ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        清空全部条目（本进程导入数据提交后调用）
+        """
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        返回缓存计数和当前占用
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+# 共享缓存：单飞锁的租约时间（秒），计算者崩溃时锁在租约到期后自动失效
+LOCK_LEASE = 60
+
+# 等待其它进程计算结果时的轮询间隔（秒）
+LOCK_POLL_INTERVAL = 0.05
+
+# 命中时最多每隔多少秒更新一次最近使用时间，避免每次命中都写库
+TOUCH_INTERVAL = 10
+
+
+class SharedResultCache:
+    """
+    同一主机上多个工作进程共享的结果缓存，存放在独立的 SQLite 文件中
+
+    与 ResultCache 使用相同的失效约定（数据代数 + TTL + 按字节数 LRU 淘汰），
+    并提供跨进程的单飞（single-flight）计算：同一键、同一数据代数下只有一个
+    进程执行计算，其余进程等待并读取其结果。缓存值须可 JSON 序列化。
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.computes = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                size INTEGER NOT NULL,
+                value TEXT NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS result_cache_locks (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )
+            ''')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def _key_text(key):
+        return json.dumps(key, default=str, ensure_ascii=False)
+
+    def _read(self, key_text, generation):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, last_used FROM result_cache WHERE key = ? AND generation = ? AND expires_at > ?',
+            (key_text, generation, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            conn.execute('UPDATE result_cache SET last_used = ? WHERE key = ?', (now, key_text))
+        return json.loads(row[0])
+
+    def get(self, key, generation):
+        """
+        返回缓存值；不存在、已过期、数据代数已变化或早于最新代数时返回 None
+        """
+        value = self._read(self._key_text(key), generation)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def put(self, key, generation, value):
+        """
+        写入缓存值，同时清理旧数据代数的条目，并按字节数淘汰最久未使用的条目；
+        generation 早于已缓存的最新代数时不写入
+        """
+        text = json.dumps(value, ensure_ascii=False)
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 其它进程已写入更新代数的条目时，本次结果已过期，不写入也不清理
+            newest = conn.execute(
+                'SELECT MAX(generation) FROM result_cache WHERE expires_at > ?', (now,)
+            ).fetchone()[0]
+            if newest is not None and generation < newest:
+                conn.execute('ROLLBACK')
+                return
+            conn.execute('DELETE FROM result_cache WHERE generation < ? OR expires_at <= ?', (generation, now))
+            conn.execute(
+                'INSERT OR REPLACE INTO result_cache (key, generation, expires_at, last_used, size, value) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (self._key_text(key), generation, now + self.ttl, now, size, text)
+            )
+            total = conn.execute('SELECT SUM(size) FROM result_cache').fetchone()[0] or 0
+            if total > self.max_bytes:
+                evicted = 0
+                for old_key, old_size in conn.execute(
+                        'SELECT key, size FROM result_cache ORDER BY last_used').fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute('DELETE FROM result_cache WHERE key = ?', (old_key,))
+                    total -= old_size
+                    evicted += 1
+                with self._stats_lock:
+                    self.evictions += evicted
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _acquire(self, key_text):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('DELETE FROM result_cache_locks WHERE key = ? AND expires_at <= ?', (key_text, now))
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO result_cache_locks (key, expires_at) VALUES (?, ?)',
+            (key_text, now + LOCK_LEASE)
+        )
+        return cursor.rowcount == 1
+
+    def _release(self, key_text):
+        self._connect().execute('DELETE FROM result_cache_locks WHERE key = ?', (key_text,))
+
+    def get_or_compute(self, key, generation, compute):
+        """
+        返回缓存值；未命中时只由一个进程（线程）调用 compute 计算并写入，
+        其余调用者等待其结果，等待超过租约时间则自行计算
+        """
+        key_text = self._key_text(key)
+        value = self._read(key_text, generation)
+        if value is not None:
+            self._count('hits')
+            return value
+        self._count('misses')
+
+        deadline = time.monotonic() + LOCK_LEASE
+        waited = False
+        while True:
+            if self._acquire(key_text):
+                try:
+                    # 拿到锁后再查一次，结果可能刚由其它进程写入
+                    value = self._read(key_text, generation)
+                    if value is None:
+                        value = compute()
+                        self._count('computes')
+                        self.put(key, generation, value)
+                    return value
+                finally:
+                    self._release(key_text)
+            if not waited:
+                waited = True
+                self._count('waits')
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self._read(key_text, generation)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                self._count('computes')
+                return compute()
+
+    def stats(self):
+        """
+        返回本进程的计数和共享缓存当前占用
+        """
+        conn = self._connect()
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache').fetchone()
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'computes': self.computes,
+                'waits': self.waits,
+                'evictions': self.evictions,
+            }
+
+
+class _InFlight:
+    """
+    一次正在执行的计算，等待者通过 event 获取结果或异常
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.value = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    进程内单飞：相同键的并发调用只有第一个（leader）执行 compute，
+    其余调用等待并共享其返回值或异常；等待超过 timeout 秒则自行计算
+    """
+
+    def __init__(self, timeout=LOCK_LEASE):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.max_waiters = 0
+
+    def run(self, key, compute):
+        """
+        执行或等待 key 对应的计算，返回其结果
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _InFlight()
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.event.wait(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                return compute()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.max_waiters = max(self.max_waiters, call.waiters)
+            call.event.set()
+        return call.value
+
+    def stats(self):
+        """
+        返回合并计数：leaders 为实际执行次数，coalesced 为等待并共享结果的请求数
+        """
+        with self._lock:
+            requests = self.leaders + self.coalesced
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesce_rate': round(self.coalesced / requests, 4) if requests else 0.0,
+                'max_waiters': self.max_waiters,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+            }
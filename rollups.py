@@ -0,0 +1,811 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+入库时增量维护的汇总表（rollup）
+
+所有导入路径在写入 test_reports / test_info / measurements 之后、提交事务之前
+调用 apply_report(cursor, report_id)，汇总表与明细数据在同一事务内更新。
+
+用法（按明细数据重建全部汇总表）：
+    python rollups.py --rebuild
+
+可选参数：
+    --db DATABASE: 指定数据库文件路径，默认为 'test_reports.sqlite'
+"""
+
+import argparse
+import math
+import sqlite3
+
+import search_index
+from quantile_sketch import KLLSketch
+
+# 默认数据库文件
+DEFAULT_DB = 'test_reports.sqlite'
+
+# 每日良率汇总表：按 日期 + 部件号 + 测试工位 + 测试子项 聚合报告结果
+DAILY_YIELD_TABLE = '''
+CREATE TABLE IF NOT EXISTS daily_yield_rollup (
+    date TEXT NOT NULL,
+    part_number TEXT NOT NULL,
+    tester_id TEXT NOT NULL,
+    test_sub TEXT NOT NULL DEFAULT '',
+    total_count INTEGER NOT NULL DEFAULT 0,
+    pass_count INTEGER NOT NULL DEFAULT 0,
+    fail_count INTEGER NOT NULL DEFAULT 0,
+    aborted_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, part_number, tester_id, test_sub)
+)'''
+
+# 元数据表：generation 为数据代数，每次导入报告或重建汇总表时加 1，读接口可据此判断缓存是否过期；
+# report_count / report_max_id 为汇总表对应的明细表指纹（报告数和最大报告ID），
+# 随导入一起更新，ensure_ready 据此发现绕过导入流程删除/清空报告的情况
+META_TABLE = '''
+CREATE TABLE IF NOT EXISTS rollup_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+)'''
+
+# 每日良率汇总表的维度列，可用于 /api/statistics/daily-yield 的 group_by
+DAILY_YIELD_DIMENSIONS = ('part_number', 'tester_id', 'test_sub')
+
+# 良率立方体：按 日期 + 部件号 + 测试工位 + 测试子项 + 站点 + 操作员 聚合报告结果，
+# 任意维度组合的切片/下钻都在该表上 GROUP BY，不访问明细表
+YIELD_CUBE_TABLE = '''
+CREATE TABLE IF NOT EXISTS yield_cube (
+    date TEXT NOT NULL,
+    part_number TEXT NOT NULL,
+    tester_id TEXT NOT NULL,
+    test_sub TEXT NOT NULL,
+    tester_site TEXT NOT NULL,
+    operator_id TEXT NOT NULL,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    pass_count INTEGER NOT NULL DEFAULT 0,
+    fail_count INTEGER NOT NULL DEFAULT 0,
+    aborted_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, part_number, tester_id, test_sub, tester_site, operator_id)
+)'''
+
+# 良率立方体的维度列，可用于 /api/statistics/yield-cube 的 group_by 和过滤
+YIELD_CUBE_DIMENSIONS = ('date', 'part_number', 'tester_id', 'test_sub', 'tester_site', 'operator_id')
+
+# 按部件号/测试工位过滤（不限日期）时使用的索引
+YIELD_CUBE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_yield_cube_part_number ON yield_cube (part_number, date)',
+    'CREATE INDEX IF NOT EXISTS idx_yield_cube_tester_id ON yield_cube (tester_id, date)',
+)
+
+# 良率立方体累加，{report_filter} 为空时覆盖全部报告；站点和操作员取报告的第一条 test_info，
+# {test_info} 为 YIELD_CUBE_NO_TEST_INFO 时计入站点/操作员为空的格子；{sign} 为 '-' 时从格子中减去
+YIELD_CUBE_UPSERT = '''
+INSERT INTO yield_cube
+(date, part_number, tester_id, test_sub, tester_site, operator_id,
+ total_count, pass_count, fail_count, aborted_count, error_count)
+SELECT COALESCE(r.date, ''), COALESCE(r.part_number, ''), COALESCE(r.tester_id, ''), COALESCE(r.test_sub, ''),
+       {test_info},
+       {sign}COUNT(*),
+       {sign}SUM(CASE WHEN r.result = 'Pass' THEN 1 ELSE 0 END),
+       {sign}SUM(CASE WHEN r.result = 'Fail' THEN 1 ELSE 0 END),
+       {sign}SUM(CASE WHEN r.result = 'Aborted' THEN 1 ELSE 0 END),
+       {sign}SUM(CASE WHEN r.result = 'Error' THEN 1 ELSE 0 END)
+FROM test_reports r
+LEFT JOIN test_info t ON t.id = (SELECT MIN(id) FROM test_info WHERE report_id = r.id)
+WHERE 1 = 1 {report_filter}
+GROUP BY 1, 2, 3, 4, 5, 6
+ON CONFLICT (date, part_number, tester_id, test_sub, tester_site, operator_id) DO UPDATE SET
+    total_count = total_count + excluded.total_count,
+    pass_count = pass_count + excluded.pass_count,
+    fail_count = fail_count + excluded.fail_count,
+    aborted_count = aborted_count + excluded.aborted_count,
+    error_count = error_count + excluded.error_count
+'''
+
+# YIELD_CUBE_UPSERT 的站点/操作员取值
+YIELD_CUBE_TEST_INFO = "COALESCE(t.tester_site, ''), COALESCE(t.operator_id, '')"
+YIELD_CUBE_NO_TEST_INFO = "'', ''"
+
+# 测量项运行统计表：按 测量项名称 + 部件号 保存可累加的计数/和/平方和/极值，
+# 按名称查询时把该名称下各部件号的行合并即可
+MEASUREMENT_STATS_TABLE = '''
+CREATE TABLE IF NOT EXISTS measurement_stats (
+    name TEXT NOT NULL,
+    part_number TEXT NOT NULL,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    pass_count INTEGER NOT NULL DEFAULT 0,
+    fail_count INTEGER NOT NULL DEFAULT 0,
+    value_count INTEGER NOT NULL DEFAULT 0,
+    value_sum REAL NOT NULL DEFAULT 0,
+    value_sumsq REAL NOT NULL DEFAULT 0,
+    value_min REAL,
+    value_max REAL,
+    time_count INTEGER NOT NULL DEFAULT 0,
+    time_sum REAL NOT NULL DEFAULT 0,
+    time_min REAL,
+    time_max REAL,
+    result_type TEXT,
+    lower_limit TEXT,
+    upper_limit TEXT,
+    unit_of_measure TEXT,
+    PRIMARY KEY (name, part_number)
+)'''
+
+# 测量值分位数草图表：按 测量项名称 + 部件号 保存可合并的 KLL 草图（JSON）
+MEASUREMENT_SKETCH_TABLE = '''
+CREATE TABLE IF NOT EXISTS measurement_sketches (
+    name TEXT NOT NULL,
+    part_number TEXT NOT NULL,
+    sketch TEXT NOT NULL,
+    PRIMARY KEY (name, part_number)
+)'''
+
+# 报告详情缓存：报告入库后不再变化，首次访问时把详情 JSON 压缩后保存，之后直接返回；
+# 为已有报告补录测试信息、测量数据或重建汇总表时删除对应缓存
+REPORT_DETAIL_CACHE_TABLE = '''
+CREATE TABLE IF NOT EXISTS report_detail_cache (
+    report_id INTEGER PRIMARY KEY,
+    etag TEXT NOT NULL,
+    body BLOB NOT NULL
+)'''
+
+# 目录表：各维度的不同取值及其出现次数、首次/最近出现日期，供筛选下拉框使用。
+# measurement_name 按部件号分行（count 为测量记录数），其余维度 part_number 为空（count 为报告数）
+CATALOG_TABLE = '''
+CREATE TABLE IF NOT EXISTS catalog (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    part_number TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT,
+    last_seen TEXT,
+    PRIMARY KEY (kind, value, part_number)
+)'''
+
+# 目录维度 -> /api/catalog 中的键
+CATALOG_KINDS = {
+    'part_number': 'part_numbers',
+    'tester_id': 'testers',
+    'tester_site': 'sites',
+    'test_spec_id': 'test_specs',
+    'date': 'dates',
+    'measurement_name': 'measurement_names',
+}
+
+# 报告级目录取值，{report_filter} 为空时覆盖全部报告
+CATALOG_REPORT_VALUES = '''
+SELECT kind, value, '', COUNT(*), MIN(date), MAX(date) FROM (
+    SELECT 'part_number' AS kind, part_number AS value, date FROM test_reports r WHERE 1 = 1 {report_filter}
+    UNION ALL
+    SELECT 'tester_id', tester_id, date FROM test_reports r WHERE 1 = 1 {report_filter}
+    UNION ALL
+    SELECT 'date', date, date FROM test_reports r WHERE 1 = 1 {report_filter}
+)
+WHERE value IS NOT NULL AND value != ''
+GROUP BY kind, value
+'''
+
+# 测试信息目录取值（按报告计数），{report_filter} 为空时覆盖全部报告
+CATALOG_TEST_INFO_VALUES = '''
+SELECT kind, value, '', COUNT(*), MIN(date), MAX(date) FROM (
+    SELECT 'tester_site' AS kind, tester_site AS value, date FROM (
+        SELECT DISTINCT r.id, t.tester_site, r.date
+        FROM test_info t JOIN test_reports r ON r.id = t.report_id WHERE 1 = 1 {report_filter}
+    )
+    UNION ALL
+    SELECT 'test_spec_id', test_spec_id, date FROM (
+        SELECT DISTINCT r.id, t.test_spec_id, r.date
+        FROM test_info t JOIN test_reports r ON r.id = t.report_id WHERE 1 = 1 {report_filter}
+    )
+)
+WHERE value IS NOT NULL AND value != ''
+GROUP BY kind, value
+'''
+
+# 测试项目录取值（按部件号），{report_filter} 为空时覆盖全部测量记录
+CATALOG_MEASUREMENT_VALUES = '''
+SELECT 'measurement_name', m.name, COALESCE(r.part_number, ''), COUNT(*), MIN(r.date), MAX(r.date)
+FROM measurements m JOIN test_reports r ON r.id = m.report_id
+WHERE m.name IS NOT NULL AND m.name != '' {report_filter}
+GROUP BY m.name, COALESCE(r.part_number, '')
+'''
+
+# 目录累加：次数相加，首次/最近出现日期取较早/较晚者
+CATALOG_UPSERT = '''
+INSERT INTO catalog (kind, value, part_number, count, first_seen, last_seen)
+{values}
+ON CONFLICT (kind, value, part_number) DO UPDATE SET
+    count = count + excluded.count,
+    first_seen = COALESCE(MIN(first_seen, excluded.first_seen), first_seen, excluded.first_seen),
+    last_seen = COALESCE(MAX(last_seen, excluded.last_seen), last_seen, excluded.last_seen)
+'''
+
+# 测试项失败计数表：按 日期 + 测试项名称 + 部件号 + 测试工位 统计非 pass 的测量记录数，
+# 供不良项目 TOP N 按任意日期窗口查询
+FAIL_ROLLUP_TABLE = '''
+CREATE TABLE IF NOT EXISTS measurement_fail_rollup (
+    date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    part_number TEXT NOT NULL,
+    tester_id TEXT NOT NULL,
+    fail_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date, name, part_number, tester_id)
+)'''
+
+# 失败计数累加，{report_filter} 为空时覆盖全部测量记录；
+# 与原 top-fail 统计一致，status 不区分大小写不等于 'pass' 即计为失败
+FAIL_ROLLUP_UPSERT = '''
+INSERT INTO measurement_fail_rollup (date, name, part_number, tester_id, fail_count)
+SELECT COALESCE(r.date, ''), COALESCE(m.name, ''), COALESCE(r.part_number, ''), COALESCE(r.tester_id, ''),
+       COUNT(*)
+FROM measurements m JOIN test_reports r ON r.id = m.report_id
+WHERE LOWER(m.status) != 'pass' {report_filter}
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (date, name, part_number, tester_id) DO UPDATE SET
+    fail_count = fail_count + excluded.fail_count
+'''
+
+# 明细表上的查询索引（键集分页、按报告/名称/日期查找、序列号等完全/前缀匹配依赖这些索引）
+DETAIL_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_measurements_name ON measurements (name)',
+    'CREATE INDEX IF NOT EXISTS idx_measurements_report_id ON measurements (report_id)',
+    'CREATE INDEX IF NOT EXISTS idx_test_info_report_id ON test_info (report_id)',
+    'CREATE INDEX IF NOT EXISTS idx_test_reports_date ON test_reports (date)',
+    'CREATE INDEX IF NOT EXISTS idx_test_reports_serial_number ON test_reports (serial_number)',
+    'CREATE INDEX IF NOT EXISTS idx_test_reports_part_number ON test_reports (part_number)',
+    'CREATE INDEX IF NOT EXISTS idx_test_reports_tester_id ON test_reports (tester_id)',
+    'CREATE INDEX IF NOT EXISTS idx_test_reports_filename ON test_reports (filename)',
+)
+
+# 参与数值统计的结果类型
+NUMERIC_RESULT_TYPES = ('FLOAT', 'INTEGER', 'NUMBER')
+
+# 报告结果 -> 计数列，与 /api/statistics/daily-yield 原先的 result = 'Pass' 判定保持一致
+RESULT_COLUMNS = {
+    'Pass': 'pass_count',
+    'Fail': 'fail_count',
+    'Aborted': 'aborted_count',
+    'Error': 'error_count',
+}
+
+
+def ensure_tables(cursor):
+    """
+    创建汇总表和明细表查询索引（如不存在）
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'measurements'")
+    if cursor.fetchone() is not None:
+        for statement in DETAIL_INDEXES:
+            cursor.execute(statement)
+    cursor.execute(DAILY_YIELD_TABLE)
+    cursor.execute(MEASUREMENT_STATS_TABLE)
+    cursor.execute(MEASUREMENT_SKETCH_TABLE)
+    cursor.execute(REPORT_DETAIL_CACHE_TABLE)
+    _ensure_catalog(cursor)
+    _ensure_fail_rollup(cursor)
+    _ensure_yield_cube(cursor)
+    search_index.ensure_tables(cursor)
+    cursor.execute(META_TABLE)
+    cursor.execute("INSERT OR IGNORE INTO rollup_meta (key, value) VALUES ('generation', 0)")
+    cursor.executemany(
+        'INSERT OR IGNORE INTO rollup_meta (key, value) VALUES (?, 0)',
+        (('report_count',), ('report_max_id',))
+    )
+
+
+def _create_table(cursor, name, ddl):
+    """
+    创建表（如不存在）；返回是否为本次新建且明细表已存在（需要按明细数据填充）
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    created = cursor.fetchone() is None
+    cursor.execute(ddl)
+    if not created:
+        return False
+    cursor.execute('''
+    SELECT COUNT(*) FROM sqlite_master
+    WHERE type = 'table' AND name IN ('test_reports', 'test_info', 'measurements')
+    ''')
+    return cursor.fetchone()[0] == 3
+
+
+def _ensure_catalog(cursor):
+    """
+    创建目录表；首次创建时按已有明细数据填充
+    """
+    if _create_table(cursor, 'catalog', CATALOG_TABLE):
+        _rebuild_catalog(cursor)
+
+
+def _rebuild_catalog(cursor):
+    """
+    按明细表重新计算目录表
+    """
+    cursor.execute('DELETE FROM catalog')
+    cursor.execute(CATALOG_UPSERT.format(values=CATALOG_REPORT_VALUES.format(report_filter='')))
+    cursor.execute(CATALOG_UPSERT.format(values=CATALOG_TEST_INFO_VALUES.format(report_filter='')))
+    cursor.execute(CATALOG_UPSERT.format(values=CATALOG_MEASUREMENT_VALUES.format(report_filter='')))
+
+
+def _ensure_fail_rollup(cursor):
+    """
+    创建失败计数表；首次创建时按已有明细数据填充
+    """
+    if _create_table(cursor, 'measurement_fail_rollup', FAIL_ROLLUP_TABLE):
+        _rebuild_fail_rollup(cursor)
+
+
+def _rebuild_fail_rollup(cursor):
+    """
+    按明细表重新计算失败计数表
+    """
+    cursor.execute('DELETE FROM measurement_fail_rollup')
+    cursor.execute(FAIL_ROLLUP_UPSERT.format(report_filter=''))
+
+
+def _ensure_yield_cube(cursor):
+    """
+    创建良率立方体；首次创建时按已有明细数据填充
+    """
+    populate = _create_table(cursor, 'yield_cube', YIELD_CUBE_TABLE)
+    for statement in YIELD_CUBE_INDEXES:
+        cursor.execute(statement)
+    if populate:
+        _rebuild_yield_cube(cursor)
+
+
+def _rebuild_yield_cube(cursor):
+    """
+    按明细表重新计算良率立方体
+    """
+    cursor.execute('DELETE FROM yield_cube')
+    cursor.execute(YIELD_CUBE_UPSERT.format(test_info=YIELD_CUBE_TEST_INFO, sign='', report_filter=''))
+
+
+def get_generation(cursor):
+    """
+    返回当前数据代数
+    """
+    cursor.execute("SELECT value FROM rollup_meta WHERE key = 'generation'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation(cursor):
+    """
+    数据代数加 1，随导入事务一起提交
+    """
+    cursor.execute("UPDATE rollup_meta SET value = value + 1 WHERE key = 'generation'")
+
+
+def _report_fingerprint(cursor):
+    """
+    明细表指纹：报告数和最大报告ID，删除或清空报告后与汇总表记录的值不再一致
+    """
+    cursor.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM test_reports')
+    return tuple(cursor.fetchone())
+
+
+def _stored_fingerprint(cursor):
+    cursor.execute("SELECT key, value FROM rollup_meta WHERE key IN ('report_count', 'report_max_id')")
+    values = dict(cursor.fetchall())
+    return values.get('report_count', 0), values.get('report_max_id', 0)
+
+
+def _store_fingerprint(cursor, fingerprint):
+    cursor.executemany(
+        'INSERT OR REPLACE INTO rollup_meta (key, value) VALUES (?, ?)',
+        zip(('report_count', 'report_max_id'), fingerprint)
+    )
+
+
+def apply_report(cursor, report_id):
+    """
+    将一条新导入的报告（含测量数据）累加到汇总表中，必须在导入事务提交前调用
+    """
+    if not _apply_report_yield(cursor, report_id):
+        return False
+    search_index.index_report(cursor, report_id)
+    # 先计入站点/操作员为空的格子，由 apply_test_info 移到测试信息对应的格子
+    cursor.execute(
+        YIELD_CUBE_UPSERT.format(test_info=YIELD_CUBE_NO_TEST_INFO, sign='', report_filter='AND r.id = ?'),
+        (report_id,)
+    )
+    report_values = CATALOG_REPORT_VALUES.format(report_filter='AND r.id = ?')
+    # 报告级取值由 3 个子查询组成，每个都需要绑定报告ID
+    cursor.execute(CATALOG_UPSERT.format(values=report_values), (report_id,) * 3)
+    apply_test_info(cursor, report_id)
+    apply_measurements(cursor, report_id)
+    return True
+
+
+def apply_measurements(cursor, report_id):
+    """
+    只累加某报告的测量数据（用于为已存在的报告补录测量数据）
+    """
+    cursor.execute('''
+    SELECT m.name, r.part_number, m.result_type, m.result_value, m.status,
+           m.test_time, m.lower_limit, m.upper_limit, m.unit_of_measure
+    FROM measurements m
+    JOIN test_reports r ON m.report_id = r.id
+    WHERE m.report_id = ?
+    ''', (report_id,))
+    stats = _accumulate_measurements(cursor)
+    _upsert_measurement_stats(cursor, stats)
+    _merge_sketches(cursor, stats)
+    search_index.index_measurements(cursor, report_id)
+    cursor.execute(
+        CATALOG_UPSERT.format(values=CATALOG_MEASUREMENT_VALUES.format(report_filter='AND m.report_id = ?')),
+        (report_id,)
+    )
+    cursor.execute(FAIL_ROLLUP_UPSERT.format(report_filter='AND m.report_id = ?'), (report_id,))
+    cursor.execute('DELETE FROM report_detail_cache WHERE report_id = ?', (report_id,))
+    bump_generation(cursor)
+
+
+def apply_test_info(cursor, report_id):
+    """
+    累加某报告的测试信息（也用于为已存在的报告补录测试信息）
+    """
+    search_index.index_test_info(cursor, report_id)
+    test_info_values = CATALOG_TEST_INFO_VALUES.format(report_filter='AND r.id = ?')
+    cursor.execute(CATALOG_UPSERT.format(values=test_info_values), (report_id,) * 2)
+    # 报告已按无测试信息计入良率立方体：从空站点/操作员的格子移到实际的格子
+    cursor.execute(
+        YIELD_CUBE_UPSERT.format(test_info=YIELD_CUBE_NO_TEST_INFO, sign='-', report_filter='AND r.id = ?'),
+        (report_id,)
+    )
+    cursor.execute(
+        YIELD_CUBE_UPSERT.format(test_info=YIELD_CUBE_TEST_INFO, sign='', report_filter='AND r.id = ?'),
+        (report_id,)
+    )
+    cursor.execute('''
+    DELETE FROM yield_cube
+    WHERE total_count = 0 AND tester_site = '' AND operator_id = ''
+      AND (date, part_number, tester_id, test_sub) IN (
+          SELECT COALESCE(date, ''), COALESCE(part_number, ''), COALESCE(tester_id, ''), COALESCE(test_sub, '')
+          FROM test_reports WHERE id = ?
+      )
+    ''', (report_id,))
+    cursor.execute('DELETE FROM report_detail_cache WHERE report_id = ?', (report_id,))
+    bump_generation(cursor)
+
+
+def _apply_report_yield(cursor, report_id):
+    """
+    将报告结果累加到 daily_yield_rollup
+    """
+    cursor.execute(
+        'SELECT date, part_number, tester_id, test_sub, result FROM test_reports WHERE id = ?',
+        (report_id,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return False
+
+    date, part_number, tester_id, test_sub, result = row
+    counts = {column: 0 for column in RESULT_COLUMNS.values()}
+    column = RESULT_COLUMNS.get(result)
+    if column:
+        counts[column] = 1
+
+    cursor.execute('''
+    INSERT INTO daily_yield_rollup
+    (date, part_number, tester_id, test_sub, total_count, pass_count, fail_count, aborted_count, error_count)
+    VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+    ON CONFLICT (date, part_number, tester_id, test_sub) DO UPDATE SET
+        total_count = total_count + 1,
+        pass_count = pass_count + excluded.pass_count,
+        fail_count = fail_count + excluded.fail_count,
+        aborted_count = aborted_count + excluded.aborted_count,
+        error_count = error_count + excluded.error_count
+    ''', (
+        date or '', part_number or '', tester_id or '', test_sub or '',
+        counts['pass_count'], counts['fail_count'],
+        counts['aborted_count'], counts['error_count']
+    ))
+    # 指纹随汇总表一起更新
+    cursor.execute('''
+    UPDATE rollup_meta SET value = CASE key
+        WHEN 'report_count' THEN value + 1
+        ELSE MAX(value, ?)
+    END
+    WHERE key IN ('report_count', 'report_max_id')
+    ''', (report_id,))
+    return True
+
+
+def _to_float(value):
+    """
+    将文本形式的数值转换为 float，无法转换时返回 None
+    """
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _accumulate_measurements(rows):
+    """
+    按 (name, part_number) 累加测量行，返回 {key: 统计字典}
+    行格式: name, part_number, result_type, result_value, status, test_time,
+            lower_limit, upper_limit, unit_of_measure
+    """
+    stats = {}
+    for row in rows:
+        name, part_number, result_type, result_value, status = row[:5]
+        test_time, lower_limit, upper_limit, unit = row[5:]
+        key = (name or '', part_number or '')
+        item = stats.get(key)
+        if item is None:
+            item = stats[key] = {
+                'total_count': 0, 'pass_count': 0, 'fail_count': 0,
+                'value_count': 0, 'value_sum': 0.0, 'value_sumsq': 0.0,
+                'value_min': None, 'value_max': None,
+                'time_count': 0, 'time_sum': 0.0, 'time_min': None, 'time_max': None,
+                'result_type': None, 'lower_limit': None, 'upper_limit': None,
+                'unit_of_measure': None, 'sketch': None,
+            }
+
+        item['total_count'] += 1
+        if status == 'PASS':
+            item['pass_count'] += 1
+        elif status == 'FAIL':
+            item['fail_count'] += 1
+
+        if result_type in NUMERIC_RESULT_TYPES:
+            value = _to_float(result_value)
+            if value is not None:
+                item['value_count'] += 1
+                item['value_sum'] += value
+                item['value_sumsq'] += value * value
+                if item['value_min'] is None or value < item['value_min']:
+                    item['value_min'] = value
+                if item['value_max'] is None or value > item['value_max']:
+                    item['value_max'] = value
+                if item['sketch'] is None:
+                    item['sketch'] = KLLSketch()
+                item['sketch'].update(value)
+
+        seconds = _to_float(test_time)
+        if seconds is not None:
+            item['time_count'] += 1
+            item['time_sum'] += seconds
+            if item['time_min'] is None or seconds < item['time_min']:
+                item['time_min'] = seconds
+            if item['time_max'] is None or seconds > item['time_max']:
+                item['time_max'] = seconds
+
+        # 类型、上下限、单位取首次出现的非空值
+        if item['result_type'] is None and result_type:
+            item['result_type'] = result_type
+        if item['lower_limit'] is None and item['upper_limit'] is None and (lower_limit or upper_limit):
+            item['lower_limit'] = lower_limit
+            item['upper_limit'] = upper_limit
+        if item['unit_of_measure'] is None and unit:
+            item['unit_of_measure'] = unit
+    return stats
+
+
+def _upsert_measurement_stats(cursor, stats):
+    """
+    将 _accumulate_measurements 的结果合并进 measurement_stats
+    """
+    cursor.executemany('''
+    INSERT INTO measurement_stats
+    (name, part_number, total_count, pass_count, fail_count,
+     value_count, value_sum, value_sumsq, value_min, value_max,
+     time_count, time_sum, time_min, time_max,
+     result_type, lower_limit, upper_limit, unit_of_measure)
+    VALUES (:name, :part_number, :total_count, :pass_count, :fail_count,
+            :value_count, :value_sum, :value_sumsq, :value_min, :value_max,
+            :time_count, :time_sum, :time_min, :time_max,
+            :result_type, :lower_limit, :upper_limit, :unit_of_measure)
+    ON CONFLICT (name, part_number) DO UPDATE SET
+        total_count = total_count + excluded.total_count,
+        pass_count = pass_count + excluded.pass_count,
+        fail_count = fail_count + excluded.fail_count,
+        value_count = value_count + excluded.value_count,
+        value_sum = value_sum + excluded.value_sum,
+        value_sumsq = value_sumsq + excluded.value_sumsq,
+        value_min = CASE WHEN value_min IS NULL OR excluded.value_min < value_min
+                         THEN excluded.value_min ELSE value_min END,
+        value_max = CASE WHEN value_max IS NULL OR excluded.value_max > value_max
+                         THEN excluded.value_max ELSE value_max END,
+        time_count = time_count + excluded.time_count,
+        time_sum = time_sum + excluded.time_sum,
+        time_min = CASE WHEN time_min IS NULL OR excluded.time_min < time_min
+                        THEN excluded.time_min ELSE time_min END,
+        time_max = CASE WHEN time_max IS NULL OR excluded.time_max > time_max
+                        THEN excluded.time_max ELSE time_max END,
+        result_type = COALESCE(result_type, excluded.result_type),
+        lower_limit = CASE WHEN lower_limit IS NULL AND upper_limit IS NULL
+                           THEN excluded.lower_limit ELSE lower_limit END,
+        upper_limit = CASE WHEN lower_limit IS NULL AND upper_limit IS NULL
+                           THEN excluded.upper_limit ELSE upper_limit END,
+        unit_of_measure = COALESCE(unit_of_measure, excluded.unit_of_measure)
+    ''', [dict(item, name=name, part_number=part_number)
+          for (name, part_number), item in stats.items()])
+
+
+def _merge_sketches(cursor, stats):
+    """
+    将 _accumulate_measurements 中的分位数草图合并进 measurement_sketches
+    """
+    for (name, part_number), item in stats.items():
+        sketch = item['sketch']
+        if sketch is None:
+            continue
+        cursor.execute(
+            'SELECT sketch FROM measurement_sketches WHERE name = ? AND part_number = ?',
+            (name, part_number)
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            sketch = KLLSketch.from_json(row[0]).merge(sketch)
+        cursor.execute(
+            'INSERT OR REPLACE INTO measurement_sketches (name, part_number, sketch) VALUES (?, ?, ?)',
+            (name, part_number, sketch.to_json())
+        )
+
+
+def combine_sketches(rows):
+    """
+    合并同一测量项在多个部件号下的草图行，返回 KLLSketch（无数据时为空草图）
+    """
+    sketch = KLLSketch()
+    for row in rows:
+        sketch.merge(KLLSketch.from_json(row['sketch']))
+    return sketch
+
+
+def combine_measurement_stats(rows):
+    """
+    合并同一测量项在多个部件号下的 measurement_stats 行（sqlite3.Row 或字典），
+    返回与 /api/measurements/stats 一致的统计字典
+    """
+    rows = sorted(rows, key=lambda row: row['total_count'], reverse=True)
+    total = sum(row['total_count'] for row in rows)
+    passed = sum(row['pass_count'] for row in rows)
+    failed = sum(row['fail_count'] for row in rows)
+
+    stats = {
+        'total_count': total,
+        'pass_count': passed,
+        'fail_count': failed,
+        'pass_rate': round(passed / total * 100, 2) if total > 0 else 0,
+    }
+
+    time_count = sum(row['time_count'] for row in rows)
+    if time_count:
+        stats['min_test_time'] = min(row['time_min'] for row in rows if row['time_min'] is not None)
+        stats['max_test_time'] = max(row['time_max'] for row in rows if row['time_max'] is not None)
+        stats['avg_test_time'] = round(sum(row['time_sum'] for row in rows) / time_count, 2)
+
+    value_count = sum(row['value_count'] for row in rows)
+    if value_count:
+        value_sum = sum(row['value_sum'] for row in rows)
+        value_sumsq = sum(row['value_sumsq'] for row in rows)
+        mean = value_sum / value_count
+        stats['min_value'] = min(row['value_min'] for row in rows if row['value_min'] is not None)
+        stats['max_value'] = max(row['value_max'] for row in rows if row['value_max'] is not None)
+        stats['avg_value'] = round(mean, 2)
+        # 样本标准差；平方和相减可能因舍入误差略小于 0
+        if value_count > 1:
+            variance = max(value_sumsq - value_sum * mean, 0.0) / (value_count - 1)
+            stats['std_value'] = math.sqrt(variance)
+        else:
+            stats['std_value'] = 0.0
+
+    # 上下限与单位取记录数最多的部件号
+    for row in rows:
+        if row['lower_limit'] is not None or row['upper_limit'] is not None:
+            stats['lower_limit'] = row['lower_limit']
+            stats['upper_limit'] = row['upper_limit']
+            break
+    for row in rows:
+        if row['unit_of_measure']:
+            stats['unit_of_measure'] = row['unit_of_measure']
+            break
+    return stats
+
+
+def rebuild(conn):
+    """
+    清空并按明细表重新计算全部汇总表（删除报告或首次启用汇总表后使用）
+    """
+    cursor = conn.cursor()
+    ensure_tables(cursor)
+    cursor.execute('DELETE FROM daily_yield_rollup')
+    cursor.execute('''
+    INSERT INTO daily_yield_rollup
+    (date, part_number, tester_id, test_sub, total_count, pass_count, fail_count, aborted_count, error_count)
+    SELECT COALESCE(date, ''), COALESCE(part_number, ''), COALESCE(tester_id, ''), COALESCE(test_sub, ''),
+           COUNT(*),
+           SUM(CASE WHEN result = 'Pass' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN result = 'Fail' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN result = 'Aborted' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN result = 'Error' THEN 1 ELSE 0 END)
+    FROM test_reports
+    GROUP BY COALESCE(date, ''), COALESCE(part_number, ''), COALESCE(tester_id, ''), COALESCE(test_sub, '')
+    ''')
+
+    cursor.execute('DELETE FROM measurement_stats')
+    rows = conn.execute('''
+    SELECT m.name, r.part_number, m.result_type, m.result_value, m.status,
+           m.test_time, m.lower_limit, m.upper_limit, m.unit_of_measure
+    FROM measurements m
+    JOIN test_reports r ON m.report_id = r.id
+    ORDER BY m.id
+    ''')
+    stats = _accumulate_measurements(rows)
+    _upsert_measurement_stats(cursor, stats)
+
+    cursor.execute('DELETE FROM measurement_sketches')
+    _merge_sketches(cursor, stats)
+    cursor.execute('DELETE FROM report_detail_cache')
+    _rebuild_catalog(cursor)
+    _rebuild_fail_rollup(cursor)
+    _rebuild_yield_cube(cursor)
+    search_index.rebuild(cursor)
+    _store_fingerprint(cursor, _report_fingerprint(cursor))
+    bump_generation(cursor)
+    conn.commit()
+
+
+def ensure_ready(conn):
+    """
+    确保汇总表存在；汇总表为空而明细表已有数据（旧数据库首次启用），
+    或明细表指纹与汇总表记录的不一致（绕过导入流程删除/清空了报告）时，自动重建
+    """
+    cursor = conn.cursor()
+    ensure_tables(cursor)
+    conn.commit()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'test_reports'")
+    if cursor.fetchone() is None:
+        return
+
+    cursor.execute('''
+    SELECT EXISTS (SELECT 1 FROM daily_yield_rollup)
+       AND EXISTS (SELECT 1 FROM measurement_stats)
+       AND EXISTS (SELECT 1 FROM measurement_sketches)
+    ''')
+    has_rollup = cursor.fetchone()[0]
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM test_reports)')
+    has_reports = cursor.fetchone()[0]
+    if has_reports and not has_rollup:
+        print('汇总表为空，按明细数据重建...')
+        rebuild(conn)
+        return
+
+    if _stored_fingerprint(cursor) != _report_fingerprint(cursor):
+        print('明细数据与汇总表不一致（报告已被删除或清空），按明细数据重建...')
+        rebuild(conn)
+
+
+def main():
+    # 解析命令行参数
+    parser = argparse.ArgumentParser(description='维护入库汇总表')
+    parser.add_argument('--db', default=DEFAULT_DB, help=f'数据库文件路径（默认: {DEFAULT_DB}）')
+    parser.add_argument('--rebuild', action='store_true', help='按明细数据重建全部汇总表')
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    conn = sqlite3.connect(args.db)
+    try:
+        rebuild(conn)
+        print(f"数据库 '{args.db}' 的汇总表已重建")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
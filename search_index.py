@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+"""
+全文索引（SQLite FTS5）
+
+- measurement_comment_fts / diagnostics_fts：measurements.comment 和
+  test_info.diagnostics_value 的非空文本，按 bm25 相关度检索并返回带高亮的片段；
+- report_lookup_fts：test_reports 的序列号、部件号、测试工位和文件名，使用 trigram
+  分词，支持任意子串匹配（LIKE '%x%' 可使用该索引，检索词至少 3 个字符）。
+
+各索引的 rowid 与对应明细表的 id 一致，由 rollups.apply_report 在导入事务内写入，
+与明细数据一起提交。
+"""
+
+# 测量备注索引，rowid = measurements.id
+MEASUREMENT_COMMENT_FTS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS measurement_comment_fts USING fts5(
+    comment,
+    report_id UNINDEXED,
+    tokenize = 'unicode61'
+)'''
+
+# 诊断信息索引，rowid = test_info.id
+DIAGNOSTICS_FTS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS diagnostics_fts USING fts5(
+    diagnostics_value,
+    report_id UNINDEXED,
+    tokenize = 'unicode61'
+)'''
+
+# 报告查找索引，rowid = test_reports.id
+REPORT_LOOKUP_FTS = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS report_lookup_fts USING fts5(
+    serial_number,
+    part_number,
+    tester_id,
+    filename,
+    tokenize = 'trigram'
+)'''
+
+# 索引表 -> (建表语句, 来源表, 写入语句, 报告ID列)；
+# 写入语句末尾追加 AND <报告ID列> = ? 即只写入一份报告
+FTS_INDEXES = {
+    'measurement_comment_fts': (MEASUREMENT_COMMENT_FTS, 'measurements', '''
+    INSERT INTO measurement_comment_fts (rowid, comment, report_id)
+    SELECT id, comment, report_id FROM measurements
+    WHERE comment IS NOT NULL AND comment != ''
+    ''', 'report_id'),
+    'diagnostics_fts': (DIAGNOSTICS_FTS, 'test_info', '''
+    INSERT INTO diagnostics_fts (rowid, diagnostics_value, report_id)
+    SELECT id, diagnostics_value, report_id FROM test_info
+    WHERE diagnostics_value IS NOT NULL AND diagnostics_value != ''
+    ''', 'report_id'),
+    'report_lookup_fts': (REPORT_LOOKUP_FTS, 'test_reports', '''
+    INSERT INTO report_lookup_fts (rowid, serial_number, part_number, tester_id, filename)
+    SELECT id, serial_number, part_number, tester_id, filename FROM test_reports
+    WHERE 1 = 1
+    ''', 'id'),
+}
+
+# 报告查找支持的字段
+LOOKUP_FIELDS = ('serial_number', 'part_number', 'tester_id', 'filename')
+
+# trigram 索引可用于子串匹配的最短检索词长度
+TRIGRAM_MIN_LENGTH = 3
+
+# 可检索的来源
+SEARCH_SOURCES = ('comment', 'diagnostics')
+
+# 片段前后的高亮标记和片段长度（词数）
+SNIPPET_START = '<b>'
+SNIPPET_END = '</b>'
+SNIPPET_TOKENS = 12
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def ensure_tables(cursor):
+    """
+    创建全文索引表（如不存在）；首次创建时按已有明细数据建立索引
+    """
+    for name, (ddl, source, populate, _) in FTS_INDEXES.items():
+        created = not _table_exists(cursor, name)
+        cursor.execute(ddl)
+        if created and _table_exists(cursor, source):
+            cursor.execute(populate)
+
+
+def _index_report(cursor, name, report_id):
+    _, _, populate, key = FTS_INDEXES[name]
+    cursor.execute(f'{populate} AND {key} = ?', (report_id,))
+
+
+def index_report(cursor, report_id):
+    """
+    索引某报告的序列号、部件号、测试工位、文件名
+    """
+    _index_report(cursor, 'report_lookup_fts', report_id)
+
+
+def index_measurements(cursor, report_id):
+    """
+    索引某报告测量数据中的非空备注
+    """
+    _index_report(cursor, 'measurement_comment_fts', report_id)
+
+
+def index_test_info(cursor, report_id):
+    """
+    索引某报告测试信息中的非空诊断信息
+    """
+    _index_report(cursor, 'diagnostics_fts', report_id)
+
+
+def rebuild(cursor):
+    """
+    清空并按明细表重建全部全文索引
+    """
+    ensure_tables(cursor)
+    for name, (_, _, populate, _) in FTS_INDEXES.items():
+        cursor.execute(f'DELETE FROM {name}')
+        cursor.execute(populate)
+
+
+def substring_filter(field, text):
+    """
+    返回 test_reports 上按子串过滤某字段的 (SQL 条件, 参数)：
+    检索词不少于 3 个字符时走 trigram 索引，否则退回 LIKE 扫描
+    """
+    pattern = f'%{text}%'
+    if len(text) >= TRIGRAM_MIN_LENGTH:
+        return f'id IN (SELECT rowid FROM report_lookup_fts WHERE {field} LIKE ?)', pattern
+    return f'{field} LIKE ?', pattern
+
+
+def prefix_upper_bound(text):
+    """
+    前缀范围查询（value >= text AND value < 上界）的上界：去掉末尾的 U+10FFFF 后把最后一个字符加 1
+    （跳过无法编码的代理区）；text 全部由 U+10FFFF 组成时没有上界，返回 None
+    """
+    text = text.rstrip('\U0010ffff')
+    if not text:
+        return None
+    code = ord(text[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return text[:-1] + chr(code)
+
+
+def lookup_reports(cursor, text, fields=LOOKUP_FIELDS, limit=20):
+    """
+    按序列号/部件号/测试工位/文件名查找报告：先返回完全匹配，其次前缀匹配，最后子串匹配，
+    同一级别内按报告ID降序。每项为报告行加上 match（exact/prefix/substring）和 field
+    """
+    results = []
+    seen = set()
+
+    def collect(match, field, where, params, accept=None):
+        remaining = limit - len(results)
+        if remaining <= 0:
+            return
+        cursor.execute(
+            f'SELECT * FROM test_reports WHERE {where} ORDER BY id DESC LIMIT ?',
+            params + [remaining + len(seen)]
+        )
+        columns = [col[0] for col in cursor.description]
+        for row in cursor.fetchall():
+            item = dict(zip(columns, row))
+            if item['id'] in seen or len(results) >= limit:
+                continue
+            if accept is not None and not accept(item[field]):
+                continue
+            seen.add(item['id'])
+            item['match'] = match
+            item['field'] = field
+            results.append(item)
+
+    # 完全匹配和前缀匹配使用 B-tree 索引（区分大小写）
+    for field in fields:
+        collect('exact', field, f'{field} = ?', [text])
+    upper = prefix_upper_bound(text)
+    for field in fields:
+        if upper is None:
+            collect('prefix', field, f'{field} > ?', [text])
+        else:
+            collect('prefix', field, f'{field} > ? AND {field} < ?', [text, upper])
+    # 子串匹配使用 trigram 索引（不区分大小写）；检索词中的 % 和 _ 在 LIKE 中是通配符，
+    # 因此再按字面子串过滤一次
+    if len(text) >= TRIGRAM_MIN_LENGTH:
+        needle = text.lower()
+        for field in fields:
+            collect(
+                'substring', field,
+                f'id IN (SELECT rowid FROM report_lookup_fts WHERE {field} LIKE ?)',
+                [f'%{text}%'],
+                lambda value: value is not None and needle in value.lower()
+            )
+    return results
+
+
+def build_match_query(text):
+    """
+    将用户输入转换为 FTS5 查询：每个词作为短语加引号（避免特殊字符引起语法错误），
+    多个词之间为“且”的关系；以 * 结尾的词按前缀匹配
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search(cursor, text, sources=SEARCH_SOURCES, limit=50):
+    """
+    检索备注和诊断信息，返回按相关度排序的命中列表
+
+    每项包含 source、report_id、serial_number、part_number、date、snippet、score，
+    备注命中还包含 measurement_id（measurements.id）和 name。
+    已删除的报告/测量记录通过与明细表连接自动过滤。
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    hits = []
+    if 'comment' in sources:
+        cursor.execute(f'''
+        SELECT f.rowid, m.report_id, m.name,
+               snippet(measurement_comment_fts, 0, ?, ?, '...', {SNIPPET_TOKENS}),
+               bm25(measurement_comment_fts) AS score,
+               r.serial_number, r.part_number, r.date
+        FROM measurement_comment_fts f
+        JOIN measurements m ON m.id = f.rowid
+        JOIN test_reports r ON r.id = m.report_id
+        WHERE measurement_comment_fts MATCH ?
+        ORDER BY score
+        LIMIT ?
+        ''', (SNIPPET_START, SNIPPET_END, match, limit))
+        for row in cursor.fetchall():
+            hits.append({
+                'source': 'comment',
+                'measurement_id': row[0],
+                'report_id': row[1],
+                'name': row[2],
+                'snippet': row[3],
+                'score': row[4],
+                'serial_number': row[5],
+                'part_number': row[6],
+                'date': row[7],
+            })
+    if 'diagnostics' in sources:
+        cursor.execute(f'''
+        SELECT t.report_id,
+               snippet(diagnostics_fts, 0, ?, ?, '...', {SNIPPET_TOKENS}),
+               bm25(diagnostics_fts) AS score,
+               r.serial_number, r.part_number, r.date
+        FROM diagnostics_fts f
+        JOIN test_info t ON t.id = f.rowid
+        JOIN test_reports r ON r.id = t.report_id
+        WHERE diagnostics_fts MATCH ?
+        ORDER BY score
+        LIMIT ?
+        ''', (SNIPPET_START, SNIPPET_END, match, limit))
+        for row in cursor.fetchall():
+            hits.append({
+                'source': 'diagnostics',
+                'report_id': row[0],
+                'snippet': row[1],
+                'score': row[2],
+                'serial_number': row[3],
+                'part_number': row[4],
+                'date': row[5],
+            })
+
+    # bm25 分数越小越相关
+    hits.sort(key=lambda hit: hit['score'])
+    return hits[:limit]
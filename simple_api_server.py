@@ -1,10 +1,32 @@
 import os
 import sqlite3
-from flask import Flask, g, jsonify, request, send_from_directory, make_response
+import base64
+import csv
+import functools
+import gzip
+import io
+import threading
+import time
+import zlib
+from flask import Flask, g, jsonify, request, send_from_directory, make_response, Response
 import json
 from datetime import datetime, timedelta
 from flask_cors import CORS
 
+import rollups
+import query_dsl
+import search_index
+from result_cache import RequestCoalescer, ResultCache, SharedResultCache
+from typeahead import TypeaheadIndex
+from capability import compute_capability, compute_histogram
+from quantile_sketch import rank_error
+
+# brotli 为可选依赖，未安装时只使用 gzip 压缩
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__, static_folder='front/dist')
 # 添加 CORS 支持，允许所有源访问所有 API 端点
 CORS(app)
@@ -31,9 +53,46 @@ def get_status():
         'status': '运行中',
         'version': '1.0.0',
         'database': DATABASE,
-        'report_count': count
+        'report_count': count,
+        'cache': {
+            'memory': result_cache.stats(),
+            'shared': get_shared_cache().stats()
+        },
+        'coalescing': request_coalescer.stats(),
+        'query_budget': query_budget_stats()
     })
 
+# 键集分页（keyset）游标：把上一页最后一行的排序键编码为不透明字符串
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+# 分页游标中各排序键允许的类型
+CURSOR_ID = (int,)
+CURSOR_DATE = (str, type(None))
+
+def _decode_cursor(token, types):
+    """
+    解析分页游标，返回排序键列表；格式不正确或排序键类型与 types 不符时返回 None
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+    for value, allowed in zip(values, types):
+        # bool 是 int 的子类，不能作为 ID
+        if isinstance(value, bool) or not isinstance(value, allowed):
+            return None
+    return values
+
+def _invalid_cursor():
+    return jsonify({
+        'error': '无效的分页游标 (cursor)'
+    }), 400
+
 # 获取所有测试报告
 @app.route('/api/reports', methods=['GET'])
 def get_reports():
@@ -47,18 +106,31 @@ def get_reports():
     part_number = request.args.get('part_number', default=None, type=str)
     result = request.args.get('result', default=None, type=str)
     date = request.args.get('date', default=None, type=str)
+    # 传入 cursor 参数（首页传空值）时使用键集分页，返回 {reports, next}
+    page_cursor = request.args.get('cursor', default=None, type=str)
+    keyset = page_cursor is not None
     
     # 构造SQL查询
     query = 'SELECT * FROM test_reports WHERE 1=1'
     params = []
     
+    if page_cursor:
+        last_key = _decode_cursor(page_cursor, (CURSOR_ID,))
+        if last_key is None:
+            return _invalid_cursor()
+        query += ' AND id < ?'
+        params.append(last_key[0])
+    
+    # 子串匹配走 trigram 索引，避免 LIKE '%x%' 扫描全表
     if serial_number:
-        query += ' AND serial_number LIKE ?'
-        params.append(f'%{serial_number}%')
+        condition, param = search_index.substring_filter('serial_number', serial_number)
+        query += f' AND {condition}'
+        params.append(param)
     
     if part_number:
-        query += ' AND part_number LIKE ?'
-        params.append(f'%{part_number}%')
+        condition, param = search_index.substring_filter('part_number', part_number)
+        query += f' AND {condition}'
+        params.append(param)
     
     if result:
         query += ' AND result = ?'
@@ -69,7 +141,7 @@ def get_reports():
         params.append(date)
     
     query += ' ORDER BY id DESC LIMIT ? OFFSET ?'
-    params.extend([limit, offset])
+    params.extend([limit, 0 if keyset else offset])
     
     cursor.execute(query, params)
     reports = cursor.fetchall()
@@ -82,20 +154,138 @@ def get_reports():
             item[col[0]] = row[idx]
         result.append(item)
     
+    if keyset:
+        next_cursor = _encode_cursor([result[-1]['id']]) if len(result) == limit else None
+        return jsonify({
+            'limit': limit,
+            'reports': result,
+            'next': next_cursor
+        })
     return jsonify(result)
 
+# 报告快速查找单次返回的最大条数
+MAX_LOOKUP_RESULTS = 100
+
+# 按序列号/部件号/测试工位/文件名快速查找报告
+@app.route('/api/reports/lookup', methods=['GET'])
+def lookup_reports():
+    """
+    快速查找报告，完全匹配优先，其次前缀匹配，最后子串匹配
+    
+    参数:
+    - q: 查找内容（必填），子串匹配至少 3 个字符
+    - field: 可选，serial_number, part_number, tester_id, filename（逗号分隔），默认全部
+    - limit: 返回条数上限，默认20，最大100
+    """
+    q = request.args.get('q', default='', type=str).strip()
+    if not q:
+        return jsonify({'error': '必须指定查找内容 (q)'}), 400
+    fields = [
+        field.strip()
+        for field in request.args.get('field', default='', type=str).split(',')
+        if field.strip()
+    ] or list(search_index.LOOKUP_FIELDS)
+    invalid = [field for field in fields if field not in search_index.LOOKUP_FIELDS]
+    if invalid:
+        return jsonify({
+            'error': f"field 只能包含 {', '.join(search_index.LOOKUP_FIELDS)}"
+        }), 400
+    limit = request.args.get('limit', default=20, type=int)
+    limit = max(1, min(limit, MAX_LOOKUP_RESULTS))
+    
+    db = get_db()
+    results = search_index.lookup_reports(db.cursor(), q, fields, limit)
+    return jsonify({
+        'q': q,
+        'total': len(results),
+        'reports': results
+    })
+
+# measurements 表中可通过 fields 参数选择的字段
+MEASUREMENT_FIELDS = [
+    'id', 'report_id', 'measurement_id', 'step_type', 'name', 'result_type',
+    'result_value', 'status', 'unit_of_measure', 'lower_limit', 'upper_limit',
+    'test_time', 'comment'
+]
+
+# 批量获取报告详情时单次请求的报告数上限
+MAX_BATCH_REPORTS = 500
+
+def _test_info_summary(info):
+    """
+    明确映射前端需要的测试信息字段
+    """
+    return {
+        # 这些key与前端ReportDetail.jsx渲染字段一一对应
+        'test_id': info.get('test_spec_id', ''),
+        'test_type': info.get('tester_operation', ''),
+        'software_name': info.get('tester_sw_version', ''),
+        'software_version': info.get('swift_version', ''),
+        'operator': info.get('operator_id', ''),
+        'station_id': info.get('tester_site', '')
+    }
+
+# 报告详情的浏览器缓存时间（秒）
+REPORT_DETAIL_MAX_AGE = 86400
+
 # 获取单个报告详情
 @app.route('/api/reports/<int:report_id>', methods=['GET'])
 def get_report_detail(report_id):
+    """
+    报告详情：首次访问时生成 JSON 并压缩保存到 report_detail_cache，
+    之后直接返回保存的内容，耗时与测量数据条数无关
+    """
     db = get_db()
     cursor = db.cursor()
     
+    cursor.execute('SELECT etag, body FROM report_detail_cache WHERE report_id = ?', (report_id,))
+    cached = cursor.fetchone()
+    if cached:
+        etag, body = cached
+    else:
+        detail = _build_report_detail(cursor, report_id)
+        if detail is None:
+            return jsonify({'error': '报告不存在'}), 404
+        data = json.dumps(detail).encode('utf-8')
+        etag = f'r{report_id}-{zlib.crc32(data):08x}'
+        body = gzip.compress(data, compresslevel=6)
+        # 缓存写入不等待写锁：数据库被导入等写操作锁定（或只读）时不保存，
+        # 直接返回本次生成的内容，下次访问再保存
+        busy_timeout = cursor.execute('PRAGMA busy_timeout').fetchone()[0]
+        cursor.execute('PRAGMA busy_timeout = 0')
+        try:
+            cursor.execute(
+                'INSERT OR REPLACE INTO report_detail_cache (report_id, etag, body) VALUES (?, ?, ?)',
+                (report_id, etag, body)
+            )
+            db.commit()
+        except sqlite3.OperationalError:
+            db.rollback()
+        finally:
+            cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    elif 'gzip' in request.accept_encodings:
+        response = Response(body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(body), mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f'public, max-age={REPORT_DETAIL_MAX_AGE}'
+    return response
+
+def _build_report_detail(cursor, report_id):
+    """
+    查询报告的基本信息、测试信息和测量数据，报告不存在时返回 None
+    """
     # 获取报告信息
     cursor.execute('SELECT * FROM test_reports WHERE id = ?', (report_id,))
     report = cursor.fetchone()
     
     if not report:
-        return jsonify({'error': '报告不存在'}), 404
+        return None
     
     # 转换为字典
     report_dict = {}
@@ -108,18 +298,8 @@ def get_report_detail(report_id):
     test_info_dict = None
     
     if test_info:
-        # 明确映射前端需要的字段
         columns = [col[0] for col in cursor.description]
-        info = dict(zip(columns, test_info))
-        test_info_dict = {
-            # 这些key与前端ReportDetail.jsx渲染字段一一对应
-            'test_id': info.get('test_spec_id', ''),
-            'test_type': info.get('tester_operation', ''),
-            'software_name': info.get('tester_sw_version', ''),
-            'software_version': info.get('swift_version', ''),
-            'operator': info.get('operator_id', ''),
-            'station_id': info.get('tester_site', '')
-        }
+        test_info_dict = _test_info_summary(dict(zip(columns, test_info)))
     
     # 获取测量数据
     cursor.execute('SELECT * FROM measurements WHERE report_id = ?', (report_id,))
@@ -132,34 +312,282 @@ def get_report_detail(report_id):
             item[col[0]] = row[idx]
         measurements_list.append(item)
     
-    return jsonify({
+    return {
         'report': report_dict,
         'test_info': test_info_dict,
         'measurements': measurements_list
+    }
+
+# 批量获取报告详情
+@app.route('/api/reports/batch', methods=['POST'])
+def get_report_batch():
+    """
+    一次获取多份报告的详情，用于多台产品对比
+    
+    请求体(JSON):
+    - report_ids: 报告ID列表（必填，JSON 整数，最多 MAX_BATCH_REPORTS 个）
+    - fields: 可选，测量数据返回的字段列表（同 /api/measurements 的 fields），默认全部字段
+    - names: 可选，只返回这些测试项名称的测量数据
+    - include_test_info: 可选，是否返回测试信息，默认 true
+    
+    每张表只执行一次查询（按报告ID集合过滤），结果按请求中的报告ID顺序返回，
+    不存在的报告ID列在 missing 中
+    """
+    data = request.get_json(silent=True) or {}
+    report_ids = data.get('report_ids')
+    if not isinstance(report_ids, list) or not report_ids:
+        return jsonify({'error': '必须提供报告ID列表 (report_ids)'}), 400
+    # 只接受 JSON 整数：true、1.5、"3" 等不做隐式转换
+    if any(isinstance(report_id, bool) or not isinstance(report_id, int) for report_id in report_ids):
+        return jsonify({'error': '报告ID必须是整数'}), 400
+    report_ids = list(dict.fromkeys(report_ids))
+    if len(report_ids) > MAX_BATCH_REPORTS:
+        return jsonify({'error': f'一次最多获取 {MAX_BATCH_REPORTS} 份报告'}), 400
+    
+    fields = data.get('fields') or []
+    if not isinstance(fields, list):
+        return jsonify({'error': 'fields 必须是字段列表'}), 400
+    fields = [field for field in fields if field in MEASUREMENT_FIELDS]
+    names = data.get('names') or []
+    if not isinstance(names, list):
+        return jsonify({'error': 'names 必须是测试项名称列表'}), 400
+    include_test_info = data.get('include_test_info', True)
+    if not isinstance(include_test_info, bool):
+        return jsonify({'error': 'include_test_info 必须是布尔值 (true/false)'}), 400
+    
+    db = get_db()
+    cursor = db.cursor()
+    # 用 json_each 传入ID集合，不受 SQL 参数个数限制
+    ids_json = json.dumps(report_ids)
+    
+    cursor.execute(
+        'SELECT * FROM test_reports WHERE id IN (SELECT value FROM json_each(?))',
+        (ids_json,)
+    )
+    reports = {row['id']: dict(row) for row in cursor.fetchall()}
+    
+    test_infos = {}
+    if include_test_info:
+        cursor.execute(
+            'SELECT * FROM test_info WHERE report_id IN (SELECT value FROM json_each(?))',
+            (ids_json,)
+        )
+        for row in cursor.fetchall():
+            test_infos.setdefault(row['report_id'], _test_info_summary(dict(row)))
+    
+    # report_id 用于分组，指定了 fields 但不含 report_id 时不返回
+    select_clause = ', '.join(dict.fromkeys(['report_id'] + fields)) if fields else '*'
+    query = f'''
+    SELECT {select_clause} FROM measurements
+    WHERE report_id IN (SELECT value FROM json_each(?))
+    '''
+    params = [ids_json]
+    if names:
+        query += ' AND name IN (SELECT value FROM json_each(?))'
+        params.append(json.dumps([str(name) for name in names]))
+    query += ' ORDER BY report_id, id'
+    cursor.execute(query, params)
+    measurements = {}
+    for row in cursor.fetchall():
+        item = dict(row)
+        report_id = item.pop('report_id') if fields and 'report_id' not in fields else item['report_id']
+        measurements.setdefault(report_id, []).append(item)
+    
+    result = []
+    for report_id in report_ids:
+        report = reports.get(report_id)
+        if report is None:
+            continue
+        entry = {
+            'report': report,
+            'measurements': measurements.get(report_id, [])
+        }
+        if include_test_info:
+            entry['test_info'] = test_infos.get(report_id)
+        result.append(entry)
+    
+    return jsonify({
+        'total': len(result),
+        'reports': result,
+        'missing': [report_id for report_id in report_ids if report_id not in reports]
     })
 
+# 两级结果缓存：进程内缓存在前，同一主机各工作进程共享的 SQLite 缓存文件在后。
+# 两级都按字节数 LRU 淘汰，带 TTL，数据代数变化（有新导入）时失效
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+SHARED_CACHE_MAX_BYTES = 128 * 1024 * 1024
+RESULT_CACHE_TTL = 300
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
+_shared_cache = None
+
+# 进程内请求合并：相同的并发请求只计算一次，其余线程等待并共享结果
+request_coalescer = RequestCoalescer()
+
+def get_shared_cache():
+    """
+    共享缓存文件放在数据库文件旁边（<数据库>-cache），首次使用时创建
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SharedResultCache(DATABASE + '-cache', SHARED_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
+    return _shared_cache
+
+def _current_generation():
+    """
+    当前数据代数，同一请求内只查询一次
+    """
+    if 'generation' not in g:
+        g.generation = rollups.get_generation(get_db().cursor())
+    return g.generation
+
+def cached_result(key, compute):
+    """
+    依次查进程内缓存和共享缓存；都未命中时由共享缓存单飞调用 compute 计算，
+    同一数据代数下每台主机只计算一次。compute 的结果须可 JSON 序列化。
+    本进程内相同键的并发未命中先合并，只有一个线程访问共享缓存
+    """
+    generation = _current_generation()
+    value = result_cache.get(key, generation)
+    if value is None:
+        def load():
+            loaded = get_shared_cache().get_or_compute(key, generation, compute)
+            result_cache.put(key, generation, loaded)
+            return loaded
+        value = request_coalescer.run(('result', key, generation), load)
+    return value
+
+def _request_cache_key():
+    """
+    缓存键：接口名 + 规范化后的查询参数（按参数名、参数值排序，忽略空值）
+    """
+    args = tuple(sorted(
+        (key, value) for key, value in request.args.items(multi=True) if value != ''
+    ))
+    return ('view', request.endpoint, args)
+
+def _view_payload(view, args, kwargs):
+    """
+    执行视图并取出可共享的响应内容（状态码、类型、响应体）
+    """
+    response = make_response(view(*args, **kwargs))
+    return {
+        'status': response.status_code,
+        'mimetype': response.mimetype,
+        'body': response.get_data(as_text=True)
+    }
+
+def cached_view(view):
+    """
+    缓存只读接口的 JSON 响应体（压缩前）
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cached = cached_result(_request_cache_key(), lambda: _view_payload(view, args, kwargs))
+        return Response(cached['body'], status=cached['status'], mimetype=cached['mimetype'])
+    return wrapper
+
+def coalesced_view(view):
+    """
+    合并相同的并发请求（不缓存结果）：同一数据代数下参数相同的请求同时到达时只执行一次视图。
+    流式导出（format=ndjson/csv）不合并
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.args.get('format') in EXPORT_FORMATS:
+            return view(*args, **kwargs)
+        key = _request_cache_key() + (tuple(sorted(kwargs.items())), _current_generation())
+        payload = request_coalescer.run(key, lambda: _view_payload(view, args, kwargs))
+        return Response(payload['body'], status=payload['status'], mimetype=payload['mimetype'])
+    return wrapper
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = 500
+
+def _compress_response(response):
+    """
+    按客户端 Accept-Encoding 对响应体做 brotli 或 gzip 压缩
+    """
+    response.vary.add('Accept-Encoding')
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(encodings)
+    if encoding == 'br':
+        response.set_data(brotli.compress(data))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=6))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def generation_etag(view):
+    """
+    只读端点的条件请求：以数据代数作为 ETag，
+    If-None-Match 命中时直接返回 304，不执行查询；否则执行查询并压缩响应
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f'g{_current_generation()}'
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            _compress_response(response)
+        # 不同压缩编码的响应体不同，因此使用弱 ETag
+        response.set_etag(etag, weak=True)
+        response.vary.add('Accept-Encoding')
+        # 允许浏览器缓存，但每次使用前须用 ETag 重新验证
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
 # 获取统计数据
 @app.route('/api/statistics/results', methods=['GET'])
+@generation_etag
+@cached_view
 def get_result_statistics():
     db = get_db()
     cursor = db.cursor()
     
-    cursor.execute('SELECT result, COUNT(*) as count FROM test_reports GROUP BY result')
-    stats = cursor.fetchall()
+    # 从每日良率汇总表读取，耗时只与 日期×部件号×工位 组合数有关
+    cursor.execute('''
+        SELECT SUM(total_count), SUM(pass_count), SUM(fail_count),
+               SUM(aborted_count), SUM(error_count)
+        FROM daily_yield_rollup
+    ''')
+    total, passed, failed, aborted, errored = [value or 0 for value in cursor.fetchone()]
     
     result = {}
-    for row in stats:
-        result[row[0]] = row[1]
+    for key, count in (('Pass', passed), ('Fail', failed), ('Aborted', aborted), ('Error', errored)):
+        if count:
+            result[key] = count
+    # 其它无法归类的结果
+    other = total - passed - failed - aborted - errored
+    if other:
+        result['Other'] = other
     
     return jsonify(result)
 
 # 按日期统计
 @app.route('/api/statistics/by-date', methods=['GET'])
+@generation_etag
+@cached_view
 def get_date_statistics():
     db = get_db()
     cursor = db.cursor()
     
-    cursor.execute('SELECT date, COUNT(*) as count FROM test_reports GROUP BY date ORDER BY date')
+    cursor.execute('''
+        SELECT date, SUM(total_count) as count
+        FROM daily_yield_rollup
+        GROUP BY date
+        ORDER BY date
+    ''')
     stats = cursor.fetchall()
     
     result = {}
@@ -170,56 +598,361 @@ def get_date_statistics():
 
 # 每日良率统计（总数、通过、不良、良率）
 @app.route('/api/statistics/daily-yield', methods=['GET'])
+@generation_etag
+@cached_view
 def get_daily_yield():
+    """
+    按日期统计良率，可按部件号/测试工位/测试子项分组
+    
+    参数:
+    - start_date / end_date: 可选，日期范围（YYYYMMDD 或 YYYY-MM-DD，含当天）
+    - group_by: 可选，逗号分隔的分组维度：part_number, tester_id, test_sub
+    - part_number / tester_id / test_sub: 可选，按维度取值过滤
+    
+    一次返回范围内所有 日期×分组 的结果，每项包含分组字段和 total/pass/fail/yield
+    """
     db = get_db()
     cursor = db.cursor()
-    cursor.execute('''
-        SELECT date,
-               COUNT(*) as total,
-               SUM(CASE WHEN result = 'Pass' THEN 1 ELSE 0 END) as pass,
-               SUM(CASE WHEN result != 'Pass' THEN 1 ELSE 0 END) as fail
-        FROM test_reports
-        GROUP BY date
-        ORDER BY date
-    ''')
-    stats = cursor.fetchall()
+    
+    group_by = [
+        column.strip()
+        for column in request.args.get('group_by', default='', type=str).split(',')
+        if column.strip()
+    ]
+    invalid = [column for column in group_by if column not in rollups.DAILY_YIELD_DIMENSIONS]
+    if invalid:
+        return jsonify({
+            'error': f"group_by 只能包含 {', '.join(rollups.DAILY_YIELD_DIMENSIONS)}"
+        }), 400
+    # 去重并保持顺序
+    group_by = list(dict.fromkeys(group_by))
+    
+    where_clauses = []
+    params = []
+    start_date = _normalize_date(request.args.get('start_date', default=None, type=str))
+    end_date = _normalize_date(request.args.get('end_date', default=None, type=str))
+    if start_date:
+        where_clauses.append('date >= ?')
+        params.append(start_date)
+    if end_date:
+        where_clauses.append('date <= ?')
+        params.append(end_date)
+    for column in rollups.DAILY_YIELD_DIMENSIONS:
+        value = request.args.get(column, default=None, type=str)
+        if value:
+            where_clauses.append(f'{column} = ?')
+            params.append(value)
+    where_clause = ('WHERE ' + ' AND '.join(where_clauses)) if where_clauses else ''
+    
+    group_columns = ', '.join(['date'] + group_by)
+    cursor.execute(f'''
+        SELECT {group_columns},
+               SUM(total_count) as total,
+               SUM(pass_count) as pass
+        FROM daily_yield_rollup
+        {where_clause}
+        GROUP BY {group_columns}
+        ORDER BY {group_columns}
+    ''', params)
+    return jsonify(_yield_items(cursor.fetchall(), ['date'] + group_by))
+
+def _yield_items(rows, group_columns):
+    """
+    将 (分组字段..., total, pass) 行转换为带 fail 和 yield（百分比）的结果项
+    """
     result = []
-    for row in stats:
-        date, total, passed, failed = row
+    for row in rows:
+        total, passed = row['total'], row['pass']
+        # 与原逻辑一致：所有非 Pass 都计为不良
+        failed = total - passed
         yield_rate = round((passed / total) * 100, 1) if total > 0 else 0.0
-        result.append({
-            "date": date,
+        item = {}
+        for column in group_columns:
+            item[column] = row[column]
+        item.update({
             "total": total,
             "pass": passed,
             "fail": failed,
             "yield": yield_rate
         })
-    return jsonify(result)
+        result.append(item)
+    return result
+
+# 多维良率切片
+@app.route('/api/statistics/yield-cube', methods=['GET'])
+@generation_etag
+@cached_view
+def get_yield_cube():
+    """
+    按任意维度组合统计良率（切片/下钻）
+    
+    维度：date, part_number, tester_id, test_sub, tester_site, operator_id
+    
+    参数:
+    - group_by: 可选，逗号分隔的分组维度；不指定时返回一条总计
+    - start_date / end_date: 可选，日期范围（YYYYMMDD 或 YYYY-MM-DD，含当天）
+    - <维度名>: 可选，按维度取值过滤，同一维度可重复传入多个取值
+    
+    从入库时维护的 yield_cube 汇总表读取，每项包含分组字段和 total/pass/fail/yield
+    """
+    db = get_db()
+    cursor = db.cursor()
+    
+    group_by = [
+        column.strip()
+        for column in request.args.get('group_by', default='', type=str).split(',')
+        if column.strip()
+    ]
+    invalid = [column for column in group_by if column not in rollups.YIELD_CUBE_DIMENSIONS]
+    if invalid:
+        return jsonify({
+            'error': f"group_by 只能包含 {', '.join(rollups.YIELD_CUBE_DIMENSIONS)}"
+        }), 400
+    group_by = list(dict.fromkeys(group_by))
+    
+    where_clauses = []
+    params = []
+    start_date = _normalize_date(request.args.get('start_date', default=None, type=str))
+    end_date = _normalize_date(request.args.get('end_date', default=None, type=str))
+    if start_date:
+        where_clauses.append('date >= ?')
+        params.append(start_date)
+    if end_date:
+        where_clauses.append('date <= ?')
+        params.append(end_date)
+    for column in rollups.YIELD_CUBE_DIMENSIONS:
+        values = [value for value in request.args.getlist(column) if value]
+        if column == 'date':
+            values = [_normalize_date(value) for value in values]
+        if values:
+            where_clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    where_clause = ('WHERE ' + ' AND '.join(where_clauses)) if where_clauses else ''
+    
+    group_columns = ', '.join(group_by)
+    select_columns = (group_columns + ',') if group_by else ''
+    group_clause = f'GROUP BY {group_columns} ORDER BY {group_columns}' if group_by else ''
+    cursor.execute(f'''
+        SELECT {select_columns}
+               COALESCE(SUM(total_count), 0) as total,
+               COALESCE(SUM(pass_count), 0) as pass
+        FROM yield_cube
+        {where_clause}
+        {group_clause}
+    ''', params)
+    return jsonify(_yield_items(cursor.fetchall(), group_by))
+
+# 不良项目TOP N统计
+# 默认及最多返回的项目数
+DEFAULT_TOP_FAIL = 10
+MAX_TOP_FAIL = 1000
 
-# 不良项目TOP10统计
 @app.route('/api/statistics/top-fail-measurements', methods=['GET'])
+@generation_etag
+@cached_view
 def get_top_fail_measurements():
     """
-    获取所有测试中失败（非pass）项目的TOP10。
-    - 只统计 measurements.status 非 'pass'（不区分大小写）的记录
-    - 按 name 分组，统计 fail 数量，按数量降序取前10
+    获取失败（非pass）次数最多的测试项，默认全部时间范围内的TOP10
+    
+    参数:
+    - limit: 可选，返回的项目数 N（默认 10，最大 1000）
+    - start_date / end_date: 可选，日期范围（YYYYMMDD 或 YYYY-MM-DD，含当天）
+    - days: 可选，最近 N 天（截止 end_date，未指定时截止数据中最近的日期），与 start_date 互斥
+    - part_number / tester_id: 可选，按部件号/测试工位过滤
+    
+    从入库时维护的 measurement_fail_rollup 失败计数表汇总，不扫描测量明细
     """
     db = get_db()
     cursor = db.cursor()
-    cursor.execute('''
-        SELECT name, COUNT(*) as fail_count
-        FROM measurements
-        WHERE LOWER(status) != 'pass'
+    
+    limit = request.args.get('limit', default=DEFAULT_TOP_FAIL, type=int)
+    if limit < 1 or limit > MAX_TOP_FAIL:
+        return jsonify({'error': f'limit 必须在 1 到 {MAX_TOP_FAIL} 之间'}), 400
+    days = request.args.get('days', default=None, type=int)
+    start_date = _normalize_date(request.args.get('start_date', default=None, type=str))
+    end_date = _normalize_date(request.args.get('end_date', default=None, type=str))
+    if days is not None:
+        if days < 1:
+            return jsonify({'error': 'days 必须是正整数'}), 400
+        if start_date:
+            return jsonify({'error': 'days 和 start_date 不能同时指定'}), 400
+        if not end_date:
+            cursor.execute('SELECT MAX(date) FROM measurement_fail_rollup')
+            end_date = cursor.fetchone()[0]
+        if end_date:
+            try:
+                end = datetime.strptime(end_date, '%Y%m%d')
+            except ValueError:
+                return jsonify({'error': 'end_date 格式必须是 YYYYMMDD 或 YYYY-MM-DD'}), 400
+            start_date = (end - timedelta(days=days - 1)).strftime('%Y%m%d')
+    
+    where_clauses = []
+    params = []
+    if start_date:
+        where_clauses.append('date >= ?')
+        params.append(start_date)
+    if end_date:
+        where_clauses.append('date <= ?')
+        params.append(end_date)
+    for column in ('part_number', 'tester_id'):
+        value = request.args.get(column, default=None, type=str)
+        if value:
+            where_clauses.append(f'{column} = ?')
+            params.append(value)
+    where_clause = ('WHERE ' + ' AND '.join(where_clauses)) if where_clauses else ''
+    
+    cursor.execute(f'''
+        SELECT name, SUM(fail_count) as fail_count
+        FROM measurement_fail_rollup
+        {where_clause}
         GROUP BY name
-        ORDER BY fail_count DESC
-        LIMIT 10
-    ''')
+        ORDER BY fail_count DESC, name
+        LIMIT ?
+    ''', params + [limit])
     results = cursor.fetchall()
     data = [{"name": row[0], "fail_count": row[1]} for row in results]
     return jsonify(data)
 
+# 流式导出格式及每批读取的行数
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_BATCH_SIZE = 1000
+
+def _invalid_export_format(extra_formats=()):
+    formats = ('json',) + tuple(extra_formats) + EXPORT_FORMATS
+    return jsonify({
+        'error': f"format 参数必须是 {', '.join(formats)} 之一"
+    }), 400
+
+def _export_response(cursor, export_format, filename):
+    """
+    流式输出已执行查询的结果：fetchmany 分批读取，逐批写出 NDJSON 或 CSV，
+    客户端支持时即时 gzip 压缩，内存占用与结果总行数无关
+    """
+    columns = []
+    keep = []
+    for idx, col in enumerate(cursor.description):
+        if col[0] == '_keyset_id':
+            continue
+        columns.append(col[0].split('.')[-1])
+        keep.append(idx)
+    
+    # 连接交给生成器管理，请求结束时的 teardown 不再关闭它；
+    # 导出在请求上下文之外持续读取，进度回调无法访问 g，因此移除
+    connection = g.pop('_database', None)
+    if connection is not None:
+        connection.set_progress_handler(None, 0)
+    
+    def batches():
+        try:
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield [[row[idx] for idx in keep] for row in rows]
+        finally:
+            if connection is not None:
+                connection.close()
+    
+    def generate_ndjson():
+        for rows in batches():
+            yield ''.join(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+            )
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in batches():
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # 没有数据时也要输出表头
+        if buffer.getvalue():
+            yield buffer.getvalue()
+    
+    def gzip_chunks(chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            # 每批同步刷新，保证客户端能尽快收到数据
+            yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    
+    if export_format == 'csv':
+        body = generate_csv()
+        mimetype = 'text/csv'
+    else:
+        body = generate_ndjson()
+        mimetype = 'application/x-ndjson'
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename={filename}.{export_format}'
+    }
+    if 'gzip' in request.accept_encodings:
+        body = gzip_chunks(body)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    else:
+        body = (chunk.encode('utf-8') for chunk in body)
+    
+    response = Response(body, mimetype=mimetype, headers=headers)
+    # 客户端在生成器开始执行前断开时，生成器的 finally 不会执行；响应关闭时再关闭一次连接（重复关闭无影响）
+    if connection is not None:
+        response.call_on_close(connection.close)
+    return response
+
+# 总数计算方式：exact 精确 COUNT(*)；estimated 由 measurement_stats 汇总表估算；
+# cached 按筛选条件缓存精确值，直到下一次导入
+COUNT_MODES = ('exact', 'estimated', 'cached')
+
+def _invalid_count_mode():
+    return jsonify({
+        'error': f"count 参数必须是 {', '.join(COUNT_MODES)} 之一"
+    }), 400
+
+def _count_rows(cursor, mode, signature, count_query, params, estimate=None):
+    """
+    按 count 模式返回 (总数, 实际使用的模式)；无法估算时退回精确计数
+    """
+    if mode == 'estimated' and estimate is not None:
+        total = estimate()
+        if total is not None:
+            return total, 'estimated'
+    if mode == 'cached':
+        def compute():
+            cursor.execute(count_query, params)
+            return cursor.fetchone()[0]
+        return cached_result(('count',) + tuple(signature), compute), 'cached'
+    cursor.execute(count_query, params)
+    return cursor.fetchone()[0], 'exact'
+
+def _estimate_measurement_count(cursor, name=None, part_number=None, status=None):
+    """
+    用 measurement_stats 汇总表估算测量记录数（按 名称/部件号/状态 过滤）。
+    汇总表只分别统计 PASS 和 FAIL，其它状态无法估算，返回 None（退回精确计数）
+    """
+    if status and status not in ('PASS', 'FAIL'):
+        return None
+    query = 'SELECT SUM(total_count), SUM(pass_count), SUM(fail_count) FROM measurement_stats WHERE 1=1'
+    params = []
+    if name:
+        query += ' AND name = ?'
+        params.append(name)
+    if part_number:
+        query += ' AND part_number = ?'
+        params.append(part_number)
+    cursor.execute(query, params)
+    total, passed, failed = [value or 0 for value in cursor.fetchone()]
+    if not status:
+        return total
+    if status == 'PASS':
+        return passed
+    return failed
+
 # 获取测量数据
 @app.route('/api/measurements', methods=['GET'])
+@coalesced_view
 def get_measurements():
     """
     解释各个参数的含义:
@@ -229,6 +962,8 @@ def get_measurements():
     - status: 测试状态
     - limit: 限制返回的记录数
     - offset: 起始位置
+    - count: 总数计算方式 exact（默认）/estimated/cached
+    - format: json（默认）；ndjson/csv 为流式导出，未指定 limit 时导出全部匹配记录
     """
     db = get_db()
     cursor = db.cursor()
@@ -242,16 +977,23 @@ def get_measurements():
     offset = request.args.get('offset', default=0, type=int)
     # 新增部件号参数
     part_number = request.args.get('part_number', default=None, type=str)
+    # 键集分页游标，传入时忽略 offset
+    page_cursor = request.args.get('cursor', default=None, type=str)
+    count_mode = request.args.get('count', default='exact', type=str)
+    if count_mode not in COUNT_MODES:
+        return _invalid_count_mode()
+    export_format = request.args.get('format', default='json', type=str)
+    if export_format != 'json' and export_format not in EXPORT_FORMATS:
+        return _invalid_export_format()
+    if export_format != 'json':
+        # 导出默认不限制条数（SQLite 中 LIMIT -1 表示不限）
+        limit = request.args.get('limit', default=-1, type=int)
     
     # 处理字段
     if fields:
         requested_fields = fields.split(',')
         # 确保请求的字段是有效的
-        valid_fields = [
-            'id', 'report_id', 'measurement_id', 'step_type', 'name', 'result_type',
-            'result_value', 'status', 'unit_of_measure', 'lower_limit', 'upper_limit',
-            'test_time', 'comment'
-        ]
+        valid_fields = MEASUREMENT_FIELDS
         # 过滤掉无效的字段
         select_fields = []
         join_needed = False
@@ -310,16 +1052,33 @@ def get_measurements():
     if where_clauses:
         where_clause = 'WHERE ' + ' AND '.join(where_clauses)
     
-    # 获取记录数
+    # 获取记录数（按报告ID过滤时走索引，精确计数已足够便宜，不做估算）
     count_query = f"SELECT COUNT(*) {from_clause} {where_clause}"
-    cursor.execute(count_query, params)
-    total_count = cursor.fetchone()[0]
-    
-    # 构造查询
-    query = f"SELECT {select_clause} {from_clause} {where_clause} ORDER BY m.id DESC LIMIT ? OFFSET ?"
+    estimate = None
+    if not report_id:
+        estimate = lambda: _estimate_measurement_count(cursor, name, part_number, status)
+    if export_format == 'json':
+        total_count, total_mode = _count_rows(
+            cursor, count_mode, ('measurements', count_query, tuple(params)),
+            count_query, params, estimate
+        )
+    
+    # 键集分页：只取上一页最后一条之后的记录
+    if page_cursor:
+        last_key = _decode_cursor(page_cursor, (CURSOR_ID,))
+        if last_key is None:
+            return _invalid_cursor()
+        where_clause += ' AND m.id < ?' if where_clause else 'WHERE m.id < ?'
+        params.append(last_key[0])
+        offset = 0
+    
+    # 构造查询（额外取出 m.id 用于生成下一页游标）
+    query = f"SELECT {select_clause}, m.id AS _keyset_id {from_clause} {where_clause} ORDER BY m.id DESC LIMIT ? OFFSET ?"
     params.extend([limit, offset])
     
     cursor.execute(query, params)
+    if export_format != 'json':
+        return _export_response(cursor, export_format, 'measurements')
     rows = cursor.fetchall()
     
     # 转换为JSON
@@ -328,133 +1087,419 @@ def get_measurements():
         item = {}
         for idx, col in enumerate(cursor.description):
             col_name = col[0]
+            if col_name == '_keyset_id':
+                continue
             # 移除表名前缀
             if '.' in col_name:
                 col_name = col_name.split('.')[1]
             item[col_name] = row[idx]
         result.append(item)
     
+    next_cursor = _encode_cursor([rows[-1]['_keyset_id']]) if len(rows) == limit else None
+    
     return jsonify({
         'total': total_count,
+        'total_mode': total_mode,
         'limit': limit,
         'offset': offset,
-        'measurements': result
+        'measurements': result,
+        'next': next_cursor
     })
 
 # 测量统计分析
 @app.route('/api/measurements/stats', methods=['GET'])
+@coalesced_view
 def get_measurement_stats():
     """
     获取测试结果统计信息
     
     参数:
     - name: 测试项名称
+    - part_number: 可选，按部件号过滤
+    
+    统计数据来自入库时增量维护的 measurement_stats 表，只需一次按主键查找
     """
     db = get_db()
     cursor = db.cursor()
     
     name = request.args.get('name')
+    part_number = request.args.get('part_number', default=None, type=str)
     if not name:
         return jsonify({
             'error': '必须指定测试项名称 (name)'
         }), 400
     
-    # 获取统计信息
-    stats = {}
+    query = 'SELECT * FROM measurement_stats WHERE name = ?'
+    params = [name]
+    if part_number:
+        query += ' AND part_number = ?'
+        params.append(part_number)
+    cursor.execute(query, params)
     
-    # 1. 记录数
-    cursor.execute('SELECT COUNT(*) FROM measurements WHERE name = ?', (name,))
-    stats['total_count'] = cursor.fetchone()[0]
+    # 合并该测试项在各部件号下的统计行
+    stats = rollups.combine_measurement_stats(cursor.fetchall())
     
-    # 2. 通过/失败数
-    cursor.execute('''
-        SELECT status, COUNT(*) 
-        FROM measurements 
-        WHERE name = ? 
-        GROUP BY status
-    ''', (name,))
-    status_counts = {row[0]: row[1] for row in cursor.fetchall()}
-    stats['pass_count'] = status_counts.get('PASS', 0)
-    stats['fail_count'] = status_counts.get('FAIL', 0)
-    
-    # 计算通过率
-    if stats['total_count'] > 0:
-        stats['pass_rate'] = round(stats['pass_count'] / stats['total_count'] * 100, 2)
-    else:
-        stats['pass_rate'] = 0
-    
-    # 3. 测试时间统计
-    cursor.execute('''
-        SELECT 
-            MIN(test_time) as min_time,
-            MAX(test_time) as max_time,
-            AVG(test_time) as avg_time
-        FROM measurements 
-        WHERE name = ?
-    ''', (name,))
-    time_stats = cursor.fetchone()
-    if time_stats and time_stats[0] is not None:
-        stats['min_test_time'] = time_stats[0]
-        stats['max_test_time'] = time_stats[1]
-        stats['avg_test_time'] = round(time_stats[2], 2)
-    
-    # 4. 测量值统计
-    cursor.execute('''
-        SELECT result_type 
-        FROM measurements 
-        WHERE name = ? 
-        LIMIT 1
-    ''', (name,))
-    result_type = cursor.fetchone()
-    
-    # 如果是数值类型，则计算统计值
-    if result_type and result_type[0] in ['FLOAT', 'INTEGER', 'NUMBER']:
-        cursor.execute('''
-            SELECT 
-                MIN(CAST(result_value AS REAL)) as min_value,
-                MAX(CAST(result_value AS REAL)) as max_value,
-                AVG(CAST(result_value AS REAL)) as avg_value
-            FROM measurements 
-            WHERE name = ? AND result_value != ''
-        ''', (name,))
-        value_stats = cursor.fetchone()
-        if value_stats and value_stats[0] is not None:
-            stats['min_value'] = value_stats[0]
-            stats['max_value'] = value_stats[1]
-            stats['avg_value'] = round(value_stats[2], 2)
-    
-    # 5. 获取下限和上限
-    cursor.execute('''
-        SELECT lower_limit, upper_limit 
-        FROM measurements 
-        WHERE name = ? AND lower_limit IS NOT NULL AND upper_limit IS NOT NULL
-        LIMIT 1
-    ''', (name,))
-    limits = cursor.fetchone()
-    if limits:
-        stats['lower_limit'] = limits[0]
-        stats['upper_limit'] = limits[1]
-    
-    # 6. 获取最常用的单位
-    cursor.execute('''
-        SELECT unit_of_measure, COUNT(*) as count
-        FROM measurements
-        WHERE name = ? AND unit_of_measure IS NOT NULL AND unit_of_measure != ''
-        GROUP BY unit_of_measure
-        ORDER BY count DESC
-        LIMIT 1
-    ''', (name,))
-    unit = cursor.fetchone()
-    if unit:
-        stats['unit_of_measure'] = unit[0]
+    # 附加 p1/p50/p99（来自分位数草图）
+    if stats.get('std_value') is not None:
+        sketch = _load_sketch(cursor, name, part_number)
+        stats['percentiles'] = {
+            _percentile_key(p): sketch.quantile(p / 100) for p in DEFAULT_PERCENTILES
+        }
     
-    return jsonify({
+    result = {
         'name': name,
         'statistics': stats
+    }
+    if part_number:
+        result['part_number'] = part_number
+    return jsonify(result)
+
+# 默认返回的百分位
+DEFAULT_PERCENTILES = (1, 50, 99)
+
+def _percentile_key(p):
+    return f'p{p:g}'
+
+def _load_sketch(cursor, name, part_number=None):
+    """
+    读取并合并测试项的分位数草图（可按部件号过滤）
+    """
+    query = 'SELECT sketch FROM measurement_sketches WHERE name = ?'
+    params = [name]
+    if part_number:
+        query += ' AND part_number = ?'
+        params.append(part_number)
+    cursor.execute(query, params)
+    return rollups.combine_sketches(cursor.fetchall())
+
+# 测量值分位数
+@app.route('/api/measurements/percentiles', methods=['GET'])
+@coalesced_view
+def get_measurement_percentiles():
+    """
+    获取测量值的分位数，基于入库时维护的 KLL 草图，耗时与记录数无关
+    
+    参数:
+    - name: 测试项名称
+    - part_number: 可选，按部件号过滤
+    - p: 百分位列表，用逗号分隔（0~100），默认 1,50,99
+    """
+    db = get_db()
+    cursor = db.cursor()
+    
+    name = request.args.get('name')
+    part_number = request.args.get('part_number', default=None, type=str)
+    if not name:
+        return jsonify({
+            'error': '必须指定测试项名称 (name)'
+        }), 400
+    
+    p_param = request.args.get('p', default=None, type=str)
+    try:
+        if p_param:
+            percentiles = [float(item) for item in p_param.split(',') if item.strip()]
+        else:
+            percentiles = list(DEFAULT_PERCENTILES)
+    except ValueError:
+        percentiles = None
+    if not percentiles or any(p < 0 or p > 100 for p in percentiles):
+        return jsonify({
+            'error': '百分位 (p) 必须是 0~100 之间的数值，用逗号分隔'
+        }), 400
+    
+    sketch = _load_sketch(cursor, name, part_number)
+    
+    result = {
+        'name': name,
+        'count': sketch.count,
+        'exact': sketch.is_exact(),
+        # 近似结果的排名误差（比例值），精确结果时为 0
+        'rank_error': 0 if sketch.is_exact() else rank_error(sketch.k),
+        'percentiles': {_percentile_key(p): sketch.quantile(p / 100) for p in percentiles}
+    }
+    if part_number:
+        result['part_number'] = part_number
+    return jsonify(result)
+
+def _normalize_date(value):
+    """
+    日期参数统一为数据库中的 YYYYMMDD 格式，兼容 YYYY-MM-DD
+    """
+    return value.replace('-', '') if value else None
+
+# 过程能力（Cp/Cpk）报告
+@app.route('/api/measurements/capability', methods=['GET'])
+def get_measurement_capability():
+    """
+    一次计算某部件号下所有数值型测试项的过程能力
+    
+    参数:
+    - part_number: 部件号（必填）
+    - start_date: 可选，起始日期（YYYYMMDD 或 YYYY-MM-DD，含当天）
+    - end_date: 可选，结束日期（含当天）
+    
+    结果缓存到下一次导入数据为止
+    """
+    db = get_db()
+    cursor = db.cursor()
+    
+    part_number = request.args.get('part_number', default=None, type=str)
+    if not part_number:
+        return jsonify({
+            'error': '必须指定部件号 (part_number)'
+        }), 400
+    start_date = _normalize_date(request.args.get('start_date', default=None, type=str))
+    end_date = _normalize_date(request.args.get('end_date', default=None, type=str))
+    
+    def compute():
+        query = '''
+        SELECT m.name, m.result_value, m.lower_limit, m.upper_limit
+        FROM measurements m
+        JOIN test_reports r ON m.report_id = r.id
+        WHERE r.part_number = ? AND m.result_type IN ('FLOAT', 'INTEGER', 'NUMBER')
+          AND m.result_value != ''
+        '''
+        params = [part_number]
+        if start_date:
+            query += ' AND r.date >= ?'
+            params.append(start_date)
+        if end_date:
+            query += ' AND r.date <= ?'
+            params.append(end_date)
+        query += ' ORDER BY m.id'
+        cursor.execute(query, params)
+        
+        measurements = compute_capability(cursor.fetchall())
+        result = {
+            'part_number': part_number,
+            'start_date': start_date,
+            'end_date': end_date,
+            'total': len(measurements),
+            'measurements': measurements
+        }
+        return result
+    
+    result = cached_result(('capability', part_number, start_date, end_date), compute)
+    return jsonify(result)
+
+# 默认/最大直方图分桶数
+DEFAULT_HISTOGRAM_BINS = 30
+MAX_HISTOGRAM_BINS = 200
+
+def _parse_limit(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# 测量值直方图
+@app.route('/api/measurements/histogram', methods=['GET'])
+def get_measurement_histogram():
+    """
+    在服务端对测量值分桶，只返回桶边界、计数和上下限
+    
+    参数:
+    - name: 测试项名称（必填）
+    - part_number: 可选，按部件号过滤
+    - start_date / end_date: 可选，日期范围（含当天）
+    - bins: 分桶数量，默认30，最大200
+    
+    结果缓存到下一次导入数据为止
+    """
+    db = get_db()
+    cursor = db.cursor()
+    
+    name = request.args.get('name')
+    if not name:
+        return jsonify({
+            'error': '必须指定测试项名称 (name)'
+        }), 400
+    part_number = request.args.get('part_number', default=None, type=str)
+    start_date = _normalize_date(request.args.get('start_date', default=None, type=str))
+    end_date = _normalize_date(request.args.get('end_date', default=None, type=str))
+    bins = request.args.get('bins', default=DEFAULT_HISTOGRAM_BINS, type=int)
+    bins = max(1, min(bins, MAX_HISTOGRAM_BINS))
+    
+    def compute():
+        # 只有按部件号或日期过滤时才需要 JOIN
+        from_clause = 'FROM measurements m'
+        where_clauses = ['m.name = ?']
+        params = [name]
+        if part_number or start_date or end_date:
+            from_clause += ' JOIN test_reports r ON m.report_id = r.id'
+        if part_number:
+            where_clauses.append('r.part_number = ?')
+            params.append(part_number)
+        if start_date:
+            where_clauses.append('r.date >= ?')
+            params.append(start_date)
+        if end_date:
+            where_clauses.append('r.date <= ?')
+            params.append(end_date)
+        where_clause = 'WHERE ' + ' AND '.join(where_clauses)
+        
+        # 上下限和单位取最新一条记录
+        cursor.execute(
+            f"SELECT m.lower_limit, m.upper_limit, m.unit_of_measure {from_clause} {where_clause} ORDER BY m.id DESC LIMIT 1",
+            params
+        )
+        latest = cursor.fetchone()
+        lower_limit = _parse_limit(latest[0]) if latest else None
+        upper_limit = _parse_limit(latest[1]) if latest else None
+        
+        cursor.execute(
+            f"SELECT m.result_value {from_clause} {where_clause} "
+            "AND m.result_type IN ('FLOAT', 'INTEGER', 'NUMBER') AND m.result_value != ''",
+            params
+        )
+        histogram = compute_histogram((row[0] for row in cursor.fetchall()), bins, lower_limit, upper_limit)
+        
+        result = {
+            'name': name,
+            'part_number': part_number,
+            'start_date': start_date,
+            'end_date': end_date,
+            'unit_of_measure': latest[2] if latest else None,
+            'lower_limit': lower_limit,
+            'upper_limit': upper_limit,
+            'count': 0,
+            'edges': [],
+            'counts': []
+        }
+        if histogram:
+            edges, counts, min_value, max_value = histogram
+            result.update({
+                'count': sum(counts),
+                'min_value': min_value,
+                'max_value': max_value,
+                'edges': edges,
+                'counts': counts
+            })
+        return result
+    
+    result = cached_result(('histogram', name, part_number, start_date, end_date, bins), compute)
+    return jsonify(result)
+
+# 全文检索单次返回的最大命中数
+MAX_SEARCH_RESULTS = 500
+
+# 全文检索测量备注和诊断信息
+@app.route('/api/search', methods=['GET'])
+def search_text():
+    """
+    在测量备注（measurements.comment）和诊断信息（test_info.diagnostics_value）中全文检索
+    
+    参数:
+    - q: 检索词（必填），多个词为“且”的关系，以 * 结尾的词按前缀匹配
+    - source: 可选，逗号分隔的检索范围 comment, diagnostics，默认全部
+    - limit: 返回命中数上限，默认50，最大500
+    
+    命中按相关度（bm25）排序，snippet 中用 <b></b> 标出匹配词
+    """
+    q = request.args.get('q', default='', type=str).strip()
+    if not q:
+        return jsonify({'error': '必须指定检索词 (q)'}), 400
+    sources = [
+        source.strip()
+        for source in request.args.get('source', default='', type=str).split(',')
+        if source.strip()
+    ] or list(search_index.SEARCH_SOURCES)
+    invalid = [source for source in sources if source not in search_index.SEARCH_SOURCES]
+    if invalid:
+        return jsonify({
+            'error': f"source 只能包含 {', '.join(search_index.SEARCH_SOURCES)}"
+        }), 400
+    limit = request.args.get('limit', default=50, type=int)
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    
+    db = get_db()
+    hits = search_index.search(db.cursor(), q, sources, limit)
+    return jsonify({
+        'q': q,
+        'total': len(hits),
+        'results': hits
     })
 
+# 通用查询：单次最多返回的行数；需要全表扫描的表超过该行数时拒绝查询
+MAX_QUERY_ROWS = 10000
+QUERY_MAX_SCAN_ROWS = 100000
+
+@app.route('/api/query', methods=['POST'])
+def run_query():
+    """
+    按 JSON 查询描述查询报告、测试信息和测量数据
+    
+    请求体: {from, select, where, group_by, aggregates, order_by, limit, offset, explain}，
+    语法见 query_dsl.py。查询描述编译为参数化 SQL，需要全表扫描且表行数超过
+    QUERY_MAX_SCAN_ROWS 的查询返回 400；explain 为 true 时只返回 SQL 和执行计划
+    """
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        return jsonify({'error': '请求体必须是 JSON 对象'}), 400
+    
+    def compute():
+        return query_dsl.run_query(get_db().cursor(), spec, QUERY_MAX_SCAN_ROWS, MAX_QUERY_ROWS)
+    
+    try:
+        if spec.get('explain'):
+            return jsonify(compute())
+        key = ('query', json.dumps(spec, sort_keys=True, ensure_ascii=False))
+        return jsonify(cached_result(key, compute))
+    except query_dsl.QuerySpecError as e:
+        return jsonify({'error': str(e)}), 400
+
+# 测试项名称输入提示索引，数据代数变化时从 measurement_stats 重新加载
+typeahead_index = TypeaheadIndex()
+
+# 获取筛选目录（各维度取值）
+@app.route('/api/catalog', methods=['GET'])
+@generation_etag
+@cached_view
+def get_catalog():
+    """
+    一次返回筛选下拉框所需的各维度取值（部件号、测试工位、站点、测试规范、日期、
+    各部件号的测试项名称），每项包含出现次数和首次/最近出现日期
+
+    参数:
+    - kind: 可选，逗号分隔的维度，part_numbers/testers/sites/test_specs/dates/measurement_names
+    - part_number: 可选，只返回该部件号的测试项名称
+
+    由导入时维护的 catalog 表直接返回，不扫描明细表
+    """
+    kinds = {key: kind for kind, key in rollups.CATALOG_KINDS.items()}
+    requested = request.args.get('kind', default=None, type=str)
+    if requested:
+        keys = [key.strip() for key in requested.split(',') if key.strip()]
+        invalid = [key for key in keys if key not in kinds]
+        if invalid:
+            return jsonify({'error': f"kind 参数无效: {', '.join(invalid)}，可选 {', '.join(kinds)}"}), 400
+    else:
+        keys = list(kinds)
+    part_number = request.args.get('part_number', default=None, type=str)
+
+    cursor = get_db().cursor()
+    result = {}
+    for key in keys:
+        query = 'SELECT value, part_number, count, first_seen, last_seen FROM catalog WHERE kind = ?'
+        params = [kinds[key]]
+        if key == 'measurement_names' and part_number:
+            query += ' AND part_number = ?'
+            params.append(part_number)
+        cursor.execute(query + ' ORDER BY value, part_number', params)
+        items = []
+        for row in cursor.fetchall():
+            item = {'value': row['value'], 'count': row['count'],
+                    'first_seen': row['first_seen'], 'last_seen': row['last_seen']}
+            if key == 'measurement_names':
+                item = {'name': row['value'], 'part_number': row['part_number'], **item}
+                del item['value']
+            items.append(item)
+        result[key] = items
+    return jsonify(result)
+
 # 获取所有测试项名称
 @app.route('/api/measurements/names', methods=['GET'])
+@generation_etag
 def get_measurement_names():
     """
     获取measurements表中所有的测试项名称
@@ -462,10 +1507,11 @@ def get_measurement_names():
     参数:
     - q: 模糊搜索测试项名称
     - part_number: 按部件号过滤
-    """
-    db = get_db()
-    cursor = db.cursor()
+    - name: 只返回该测试项
+    - match: 可选，q 的匹配方式 substring（默认，包含）/ prefix（开头）
     
+    由内存索引直接返回，不查询明细表
+    """
     # 支持 q（项目名称模糊）、part_number、name 三种参数的双向筛查
     # 兼容 q=xxx 和 q[q]=xxx 两种写法
     q = request.args.get('q', default=None, type=str)
@@ -474,70 +1520,16 @@ def get_measurement_names():
         q = request.args.get('q[q]', default=None, type=str)
     part_number = request.args.get('part_number', default=None, type=str)
     name = request.args.get('name', default=None, type=str)
-
-    # 1. 获取项目名称列表
-    name_query = 'SELECT DISTINCT m.name FROM measurements m JOIN test_reports r ON m.report_id = r.id WHERE 1=1'
-    name_params = []
-    if part_number:
-        name_query += ' AND r.part_number = ?'
-        name_params.append(part_number)
-    if name:
-        name_query += ' AND m.name = ?'
-        name_params.append(name)
-    if q:
-        name_query += ' AND m.name LIKE ?'
-        name_params.append(f'%{q}%')
-    name_query += ' ORDER BY m.name'
-    cursor.execute(name_query, tuple(name_params))
-    names = cursor.fetchall()
-
-    # 2. 获取部件号列表
-    part_query = 'SELECT DISTINCT r.part_number FROM measurements m JOIN test_reports r ON m.report_id = r.id WHERE r.part_number IS NOT NULL'
-    part_params = []
-    if name:
-        part_query += ' AND m.name = ?'
-        part_params.append(name)
-    if part_number:
-        part_query += ' AND r.part_number = ?'
-        part_params.append(part_number)
-    if q:
-        part_query += ' AND m.name LIKE ?'
-        part_params.append(f'%{q}%')
-    part_query += ' ORDER BY r.part_number'
-    cursor.execute(part_query, tuple(part_params))
-    part_numbers = [row[0] for row in cursor.fetchall() if row[0]]
-
-    # 3. 获取每个测试项的记录数（在当前筛选下）
-    count_query = 'SELECT m.name, COUNT(*) as count FROM measurements m JOIN test_reports r ON m.report_id = r.id WHERE 1=1'
-    count_params = []
-    if part_number:
-        count_query += ' AND r.part_number = ?'
-        count_params.append(part_number)
-    if name:
-        count_query += ' AND m.name = ?'
-        count_params.append(name)
-    if q:
-        count_query += ' AND m.name LIKE ?'
-        count_params.append(f'%{q}%')
-    count_query += ' GROUP BY m.name ORDER BY m.name'
-    cursor.execute(count_query, tuple(count_params))
-    name_counts = {row[0]: row[1] for row in cursor.fetchall()}
-
-    # 4. 构造返回结果
-    result = []
-    for row in names:
-        n = row[0]
-        if n:
-            result.append({'name': n, 'count': name_counts.get(n, 0)})
-
-    return jsonify({
-        'total': len(result),
-        'names': result,
-        'part_numbers': part_numbers
-    })
+    match = request.args.get('match', default='substring', type=str)
+    if match not in ('substring', 'prefix'):
+        return jsonify({'error': 'match 参数必须是 substring 或 prefix'}), 400
+    
+    typeahead_index.refresh(get_db().cursor(), _current_generation())
+    return jsonify(typeahead_index.query(q, part_number, name, prefix=(match == 'prefix')))
 
 # 按测试项名称获取测量数据
 @app.route('/api/measurements/by-name/<string:name>', methods=['GET'])
+@coalesced_view
 def get_measurements_by_name(name):
     """
     按测试项名称获取测量数据
@@ -546,6 +1538,10 @@ def get_measurements_by_name(name):
     - name: 测试项名称
     - limit: 限制返回的记录数
     - offset: 起始位置
+    - cursor: 键集分页游标（上一页返回的 next），传入时忽略 offset
+    - count: 总数计算方式 exact（默认）/estimated/cached
+    - format: json（默认）；columnar 按列返回，所有记录相同的列只返回一次；
+      ndjson/csv 为流式导出，未指定 limit 时导出全部记录
     """
     db = get_db()
     cursor = db.cursor()
@@ -553,26 +1549,71 @@ def get_measurements_by_name(name):
     # 处理查询参数
     limit = request.args.get('limit', default=100, type=int)
     offset = request.args.get('offset', default=0, type=int)
+    page_cursor = request.args.get('cursor', default=None, type=str)
+    count_mode = request.args.get('count', default='exact', type=str)
+    if count_mode not in COUNT_MODES:
+        return _invalid_count_mode()
+    export_format = request.args.get('format', default='json', type=str)
+    if export_format not in ('json', 'columnar') and export_format not in EXPORT_FORMATS:
+        return _invalid_export_format(('columnar',))
+    if export_format in EXPORT_FORMATS:
+        limit = request.args.get('limit', default=-1, type=int)
     
     # 获取记录数
-    cursor.execute(
-        'SELECT COUNT(*) FROM measurements WHERE name = ?',
-        (name,)
-    )
-    total_count = cursor.fetchone()[0]
+    if export_format not in EXPORT_FORMATS:
+        count_query = 'SELECT COUNT(*) FROM measurements WHERE name = ?'
+        total_count, total_mode = _count_rows(
+            cursor, count_mode, ('by-name', name), count_query, (name,),
+            lambda: _estimate_measurement_count(cursor, name)
+        )
+    
+    # 排序键为 (r.date, r.id, m.id)，m.id 保证同一报告内多条同名测量的顺序稳定；
+    # 日期降序时 NULL 排在最后，行值比较遇到 NULL 结果为 NULL，因此按上一页末行的日期是否为空分别处理。
+    # 日期在 test_reports 上，每页仍需取出该名称的全部测量并排序（由 idx_measurements_name 定位），
+    # 游标省去的是 OFFSET 跳过的行，深页与首页耗时相同，但都与该名称的记录数成正比
+    where_clause = 'WHERE m.name = ?'
+    params = [name]
+    if page_cursor:
+        last_key = _decode_cursor(page_cursor, (CURSOR_DATE, CURSOR_ID, CURSOR_ID))
+        if last_key is None:
+            return _invalid_cursor()
+        last_date, last_report_id, last_id = last_key
+        if last_date is None:
+            where_clause += ' AND r.date IS NULL AND (r.id, m.id) < (?, ?)'
+            params.extend([last_report_id, last_id])
+        else:
+            where_clause += ' AND ((r.date, r.id, m.id) < (?, ?, ?) OR r.date IS NULL)'
+            params.extend([last_date, last_report_id, last_id])
+        offset = 0
+    params.extend([limit, offset])
     
     # 获取测量数据
-    cursor.execute('''
+    cursor.execute(f'''
     SELECT m.*, r.serial_number, r.part_number, r.date, r.result as test_result
     FROM measurements m
     JOIN test_reports r ON m.report_id = r.id
-    WHERE m.name = ?
-    ORDER BY r.date DESC, r.id DESC
+    {where_clause}
+    ORDER BY r.date IS NULL, r.date DESC, r.id DESC, m.id DESC
     LIMIT ? OFFSET ?
-    ''', (name, limit, offset))
+    ''', params)
+    if export_format in EXPORT_FORMATS:
+        return _export_response(cursor, export_format, 'measurements')
     
     measurements = cursor.fetchall()
     
+    if export_format == 'columnar':
+        columns = [col[0] for col in cursor.description]
+        return jsonify({
+            'name': name,
+            'total': total_count,
+            'total_mode': total_mode,
+            'limit': limit,
+            'offset': offset,
+            'count': len(measurements),
+            **_columnar(columns, measurements),
+            'next': _by_name_next_cursor(measurements, limit)
+        })
+    
     # 转换为JSON
     result = []
     for row in measurements:
@@ -584,11 +1625,37 @@ def get_measurements_by_name(name):
     return jsonify({
         'name': name,
         'total': total_count,
+        'total_mode': total_mode,
         'limit': limit,
         'offset': offset,
-        'measurements': result
+        'measurements': result,
+        'next': _by_name_next_cursor(measurements, limit)
     })
 
+def _by_name_next_cursor(rows, limit):
+    """
+    按名称查询的下一页游标，排序键为 (date, report_id, id)
+    """
+    if not rows or len(rows) != limit:
+        return None
+    last = rows[-1]
+    return _encode_cursor([last['date'], last['report_id'], last['id']])
+
+def _columnar(columns, rows):
+    """
+    将查询结果转换为按列存储：每列一个数组，所有记录取值相同的列（单位、上下限等）
+    放入 constants 只返回一次
+    """
+    constants = {}
+    data = {}
+    for idx, column in enumerate(columns):
+        values = [row[idx] for row in rows]
+        if values and all(value == values[0] for value in values):
+            constants[column] = values[0]
+        else:
+            data[column] = values
+    return {'constants': constants, 'columns': data}
+
 # XML文件处理相关函数
 def parse_filename(filename):
     """
@@ -761,11 +1828,109 @@ def parse_xml_file(xml_path):
         print(f"解析XML文件 {filename} 时出错: {e}")
         return None
 
+# 汇总表是否已在本进程中初始化
+_rollups_ready = False
+
+# 查询时间预算（秒）：请求内的 SQLite 查询累计超过预算时中止并返回 503。
+# 默认预算可用环境变量 API_QUERY_BUDGET 调整；QUERY_TIME_BUDGETS 按接口覆盖，None 表示不限制
+QUERY_BUDGET_DEFAULT = float(os.environ.get('API_QUERY_BUDGET', 10))
+QUERY_TIME_BUDGETS = {
+    'get_measurements': 30,
+    'get_measurements_by_name': 30,
+    'run_query': 30,
+    'get_measurement_names': 2,
+    'lookup_reports': 2,
+    'search_text': 5,
+    # 导入接口需要完整执行
+    'import_xml_files': None,
+    'import_folder_xml': None,
+    'upload_xml_json': None,
+    'upload_xml': None,
+}
+
+# 每执行多少条 SQLite 虚拟机指令检查一次是否超出预算
+QUERY_BUDGET_CHECK_OPS = 10000
+
+# 各接口因超出预算被中止的次数
+query_budget_aborts = {}
+_query_budget_lock = threading.Lock()
+
+def _query_budget():
+    # 流式导出（format=ndjson/csv）需要读取并排序全部匹配记录，不受预算限制
+    if request.args.get('format') in EXPORT_FORMATS:
+        return None
+    return QUERY_TIME_BUDGETS.get(request.endpoint, QUERY_BUDGET_DEFAULT)
+
+@app.before_request
+def start_query_budget():
+    g.request_started = time.monotonic()
+    g.query_budget = _query_budget()
+    # 预算从查询开始执行时计时（见 _check_query_budget），
+    # 等待合并请求或共享缓存的时间不计入预算
+    g.query_started = None
+
+def _check_query_budget():
+    """
+    SQLite 进度回调：首次回调时开始计时，超过当前请求的预算时返回非零值，
+    正在执行的语句以 interrupted 错误中止
+    """
+    budget = g.get('query_budget')
+    if budget is None:
+        return 0
+    now = time.monotonic()
+    if g.get('query_started') is None:
+        g.query_started = now
+    if now - g.query_started > budget:
+        g.query_budget_exceeded = True
+        return 1
+    return 0
+
+@app.errorhandler(sqlite3.OperationalError)
+def handle_query_interrupted(e):
+    """
+    超出时间预算而被中止的查询返回 503；其它数据库错误返回 500
+    """
+    if str(e) != 'interrupted':
+        return jsonify({'error': f'数据库错误: {e}'}), 500
+    started = g.get('query_started') or g.get('request_started', time.monotonic())
+    elapsed = time.monotonic() - started
+    # 合并请求中只有实际执行查询的请求计数，等待者共享同一个错误
+    if g.get('query_budget_exceeded'):
+        with _query_budget_lock:
+            query_budget_aborts[request.endpoint] = query_budget_aborts.get(request.endpoint, 0) + 1
+    response = jsonify({
+        'error': f'查询超出时间预算（{_query_budget()} 秒），已中止，请缩小查询范围后重试',
+        'elapsed': round(elapsed, 3),
+        'budget': _query_budget()
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = '30'
+    return response
+
+def query_budget_stats():
+    """
+    返回预算配置和各接口的中止次数
+    """
+    with _query_budget_lock:
+        aborts = dict(query_budget_aborts)
+    return {
+        'default': QUERY_BUDGET_DEFAULT,
+        'budgets': QUERY_TIME_BUDGETS,
+        'aborts': aborts,
+        'total_aborts': sum(aborts.values())
+    }
+
 def get_db():
+    global _rollups_ready
     db = getattr(g, '_database', None)
     if db is None:
         db = g._database = sqlite3.connect(DATABASE)
         db.row_factory = sqlite3.Row
+        if not _rollups_ready:
+            rollups.ensure_ready(db)
+            _rollups_ready = True
+        # 首次启动时的汇总表初始化不受预算限制
+        db.set_progress_handler(_check_query_budget, QUERY_BUDGET_CHECK_OPS)
     return db
 
 @app.teardown_appcontext
@@ -1038,7 +2203,11 @@ def import_folder_xml():
                 VALUES ({placeholders})
                 ''', valid_values)
             
+            # 4. 在同一事务内更新汇总表
+            rollups.apply_report(cursor, report_id)
+            
             db.commit()
+            result_cache.invalidate()
             
             # 处理成功后移动文件到已处理文件夹
             processed_folder = os.path.join(xml_folder, 'processed')
@@ -1165,7 +2334,11 @@ def upload_xml_json():
             VALUES ({placeholders})
             ''', valid_values)
         
+        # 4. 在同一事务内更新汇总表
+        rollups.apply_report(cursor, report_id)
+        
         db.commit()
+        result_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+quantile_sketch 的单元测试：精确模式、排名误差界、合并和序列化
+"""
+
+import bisect
+import random
+
+from quantile_sketch import DEFAULT_K, KLLSketch, rank_error
+
+QUANTILES = [i / 100 for i in range(1, 100)]
+
+
+def _max_rank_error(sketch, values):
+    """
+    返回各分位数查询结果在全体数据中的真实排名与目标分位数的最大偏差（比例值）
+    """
+    ordered = sorted(values)
+    worst = 0.0
+    for q in QUANTILES:
+        value = sketch.quantile(q)
+        low = bisect.bisect_left(ordered, value) / len(ordered)
+        high = bisect.bisect_right(ordered, value) / len(ordered)
+        worst = max(worst, max(low - q, q - high, 0.0))
+    return worst
+
+
+def _sketch(values):
+    sketch = KLLSketch()
+    for value in values:
+        sketch.update(value)
+    return sketch
+
+
+def test_exact_below_k():
+    values = list(range(DEFAULT_K))
+    random.Random(1).shuffle(values)
+    sketch = _sketch(values)
+    assert sketch.is_exact()
+    assert sketch.quantile(0.5) == sorted(values)[DEFAULT_K // 2 - 1]
+    assert _max_rank_error(sketch, values) == 0.0
+
+
+def test_empty_sketch():
+    sketch = KLLSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.merge(KLLSketch()).count == 0
+
+
+def test_rank_error_within_bound():
+    random.seed(0)
+    data = random.Random(2)
+    values = [data.gauss(0, 1) for _ in range(50000)]
+    sketch = _sketch(values)
+
+    assert not sketch.is_exact()
+    assert sketch.count == len(values)
+    assert sketch._retained() < 3 * DEFAULT_K
+    assert sketch.quantile(0) == min(values)
+    assert sketch.quantile(1) == max(values)
+    assert _max_rank_error(sketch, values) <= rank_error()
+
+
+def test_merge_matches_single_stream():
+    random.seed(0)
+    data = random.Random(3)
+    parts = [[data.uniform(0, 100) for _ in range(data.randint(1, 5000))] for _ in range(40)]
+    values = [value for part in parts for value in part]
+
+    merged = KLLSketch()
+    for part in parts:
+        merged.merge(_sketch(part))
+
+    assert merged.count == len(values)
+    assert merged.min_value == min(values)
+    assert merged.max_value == max(values)
+    assert merged._retained() < 3 * DEFAULT_K
+    assert _max_rank_error(merged, values) <= rank_error()
+
+
+def test_json_round_trip():
+    random.seed(0)
+    sketch = _sketch(range(10000))
+    restored = KLLSketch.from_json(sketch.to_json())
+    assert restored.count == sketch.count
+    assert [restored.quantile(q) for q in QUANTILES] == [sketch.quantile(q) for q in QUANTILES]
+    restored.merge(KLLSketch.from_json(sketch.to_json()))
+    assert restored.count == 2 * sketch.count
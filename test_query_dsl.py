@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+query_dsl 的单元测试：编译校验、执行计划检查（拒绝大表全表扫描）、前缀上界和数值列比较
+"""
+
+import sqlite3
+
+import pytest
+
+import rollups
+from query_dsl import TABLES, QuerySpecError, compile_query, run_query
+
+REPORTS = 50
+MEASUREMENTS_PER_REPORT = 4
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(':memory:')
+    # 与导入脚本的表结构一致：除ID外都是 TEXT 列
+    for sql_table, _, _, columns in TABLES.values():
+        conn.execute(
+            f"CREATE TABLE {sql_table} (id INTEGER PRIMARY KEY, "
+            + ', '.join(
+                f"{column} {'INTEGER' if column == 'report_id' else 'TEXT'}" for column in columns if column != 'id'
+            ) + ')'
+        )
+    for statement in rollups.DETAIL_INDEXES:
+        conn.execute(statement)
+    for report_id in range(1, REPORTS + 1):
+        conn.execute(
+            'INSERT INTO test_reports (id, serial_number, part_number, date, result) VALUES (?, ?, ?, ?, ?)',
+            (report_id, f'SN{report_id:04d}', f'P{report_id % 3}', f'202502{report_id % 28 + 1:02d}', 'Pass')
+        )
+        conn.execute('INSERT INTO test_info (report_id, tester_site) VALUES (?, ?)', (report_id, 'S1'))
+        for index in range(MEASUREMENTS_PER_REPORT):
+            conn.execute(
+                'INSERT INTO measurements (report_id, name, result_value, status, comment) VALUES (?, ?, ?, ?, ?)',
+                (report_id, f'TX{index}', str(index), 'PASS', 'ok')
+            )
+    yield conn.cursor()
+    conn.close()
+
+
+def test_indexed_query_runs(cursor):
+    result = run_query(cursor, {
+        'from': 'measurements',
+        'where': [{'field': 'name', 'op': '=', 'value': 'TX1'}],
+        'aggregates': [{'fn': 'count', 'as': 'n'}],
+    }, max_scan_rows=10)
+    assert result['results'] == [{'n': REPORTS}]
+
+
+def test_full_scan_rejected_above_limit(cursor):
+    spec = {
+        'from': 'measurements',
+        'select': ['id'],
+        'where': [{'field': 'comment', 'op': 'contains', 'value': 'ok'}],
+        'limit': 1000,
+    }
+    with pytest.raises(QuerySpecError, match='measurements'):
+        run_query(cursor, spec, max_scan_rows=10)
+    # 表足够小时允许扫描
+    result = run_query(cursor, spec, max_scan_rows=REPORTS * MEASUREMENTS_PER_REPORT)
+    assert result['total'] == REPORTS * MEASUREMENTS_PER_REPORT
+
+
+def test_joined_table_scan_rejected(cursor):
+    spec = {
+        'from': 'measurements',
+        'where': [
+            {'field': 'name', 'op': '=', 'value': 'TX1'},
+            {'field': 'test_info.tester_site', 'op': '=', 'value': 'S1'},
+        ],
+        'group_by': ['reports.part_number'],
+        'aggregates': [{'fn': 'count', 'as': 'n'}],
+    }
+    result = run_query(cursor, spec, max_scan_rows=10)
+    assert sum(row['n'] for row in result['results']) == REPORTS
+
+    spec['where'] = [{'field': 'test_info.tester_site', 'op': '=', 'value': 'S1'}]
+    with pytest.raises(QuerySpecError):
+        run_query(cursor, spec, max_scan_rows=10)
+
+
+def test_explain_reports_rejection_without_running(cursor):
+    result = run_query(cursor, {
+        'from': 'reports',
+        'select': ['id'],
+        'where': [{'field': 'result', 'op': '=', 'value': 'Pass'}],
+        'explain': True,
+    }, max_scan_rows=10)
+    assert result['rejected'] and 'test_reports' in result['rejected']
+    assert any(step.startswith('SCAN') for step in result['plan'])
+
+
+@pytest.mark.parametrize('spec, message', [
+    ({'from': 'users'}, 'from'),
+    ({'select': ['password']}, '未知的字段'),
+    ({'where': [{'field': 'name', 'op': 'like', 'value': 'x'}]}, 'op'),
+    ({'where': [{'field': 'name', 'op': 'in', 'value': []}]}, 'in'),
+    ({'where': [{'field': 'name', 'op': 'prefix', 'value': ''}]}, 'prefix'),
+    ({'select': ['name'], 'aggregates': [{'fn': 'count'}]}, 'select'),
+])
+def test_invalid_specs(spec, message):
+    with pytest.raises(QuerySpecError, match=message):
+        compile_query(spec)
+
+
+def test_prefix_range(cursor):
+    compiled = compile_query({
+        'from': 'reports',
+        'select': ['serial_number'],
+        'where': [{'field': 'serial_number', 'op': 'prefix', 'value': 'SN001'}],
+    })
+    assert compiled.params[:2] == ['SN001', 'SN002']
+    cursor.execute(compiled.sql, compiled.params)
+    assert [row[0] for row in cursor.fetchall()] == [f'SN{i:04d}' for i in range(10, 20)]
+
+
+def test_prefix_ending_with_max_code_point(cursor):
+    compiled = compile_query({
+        'from': 'reports',
+        'select': ['id'],
+        'where': [{'field': 'serial_number', 'op': 'prefix', 'value': 'SN\U0010ffff'}],
+    })
+    assert compiled.params[:2] == ['SN\U0010ffff', 'SO']
+    compiled = compile_query({
+        'from': 'reports',
+        'select': ['id'],
+        'where': [{'field': 'serial_number', 'op': 'prefix', 'value': '\U0010ffff'}],
+    })
+    assert compiled.params[0] == '\U0010ffff'
+    cursor.execute(compiled.sql, compiled.params)
+    assert cursor.fetchall() == []
+
+
+def test_numeric_text_columns_compare_as_numbers(cursor):
+    # result_value 以 TEXT 存储，按字符串比较时 '10' < '9'
+    for value in ('9', '10', '100', ''):
+        cursor.execute("INSERT INTO measurements (report_id, name, result_value) VALUES (1, 'NUM', ?)", (value,))
+
+    def values(where, order='asc'):
+        return [row['result_value'] for row in run_query(cursor, {
+            'select': ['result_value'],
+            'where': [{'field': 'name', 'op': '=', 'value': 'NUM'}] + where,
+            'order_by': [{'field': 'result_value', 'dir': order}],
+        }, max_scan_rows=10)['results']]
+
+    assert values([{'field': 'result_value', 'op': '>', 'value': 9}]) == ['10', '100']
+    assert values([{'field': 'result_value', 'op': 'between', 'value': [5, 50]}]) == ['9', '10']
+    assert values([], order='desc')[:3] == ['100', '10', '9']
+    # 与字符串比较时仍按字符串比较
+    assert values([{'field': 'result_value', 'op': '>', 'value': '9'}]) == []
+
+    result = run_query(cursor, {
+        'where': [{'field': 'name', 'op': '=', 'value': 'NUM'}],
+        'aggregates': [{'fn': 'min', 'field': 'result_value', 'as': 'lo'},
+                       {'fn': 'max', 'field': 'result_value', 'as': 'hi'}],
+    }, max_scan_rows=10)
+    assert result['results'] == [{'lo': 9.0, 'hi': 100.0}]
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+result_cache 的单元测试：ResultCache 的 LRU / TTL / 数据代数失效，
+SharedResultCache 的单飞计算，RequestCoalescer 的请求合并
+"""
+
+import threading
+import time
+
+from result_cache import RequestCoalescer, ResultCache, SharedResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=25)
+    cache.put('a', 1, 'A', size=10)
+    cache.put('b', 1, 'B', size=10)
+    # 访问 a 后 b 成为最久未使用的条目
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 1, 'C', size=10)
+
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == 'A'
+    assert cache.get('c', 1) == 'C'
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] == 20
+
+
+def test_oversized_value_not_cached():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', 1, 'A', size=11)
+    assert cache.get('a', 1) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = ResultCache(ttl=5, clock=clock)
+    cache.put('a', 1, [1, 2, 3])
+    clock.now = 4.9
+    assert cache.get('a', 1) == [1, 2, 3]
+    clock.now = 5.0
+    assert cache.get('a', 1) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_generation_change_invalidates():
+    cache = ResultCache()
+    cache.put('a', 1, 'old')
+    cache.put('b', 1, 'old')
+    assert cache.get('a', 2) is None
+    assert cache.get('b', 1) is None
+    cache.put('a', 2, 'new')
+    assert cache.get('a', 2) == 'new'
+    stats = cache.stats()
+    assert stats['invalidations'] == 1
+    assert stats['entries'] == 1
+
+
+def test_shared_cache_generation_and_round_trip(tmp_path):
+    cache = SharedResultCache(str(tmp_path / 'cache.sqlite'))
+    cache.put(('daily', 'x'), 1, {'items': [1, 2]})
+    assert cache.get(('daily', 'x'), 1) == {'items': [1, 2]}
+    assert cache.get(('daily', 'x'), 2) is None
+
+    # 另一个实例（相当于另一个工作进程）读取同一文件
+    other = SharedResultCache(str(tmp_path / 'cache.sqlite'))
+    assert other.get(('daily', 'x'), 1) == {'items': [1, 2]}
+
+
+def test_shared_cache_single_flight(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.3)
+        return {'value': 42}
+
+    def worker():
+        # 每个线程使用独立的实例，模拟多个工作进程
+        cache = SharedResultCache(path)
+        results.append(cache.get_or_compute(('slow',), 1, compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'value': 42}] * 8
+
+
+def test_shared_cache_ignores_stale_put(tmp_path):
+    cache = SharedResultCache(str(tmp_path / 'cache.sqlite'))
+    cache.put(('daily', 'x'), 2, 'new')
+    cache.put(('daily', 'y'), 1, 'stale')
+    assert cache.get(('daily', 'x'), 2) == 'new'
+    assert cache.get(('daily', 'y'), 1) is None
+
+
+def test_coalescer_runs_concurrent_calls_once():
+    coalescer = RequestCoalescer()
+    calls = []
+    results = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 'done'
+
+    def worker():
+        results.append(coalescer.run('key', compute))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['done'] * 6
+    # 结果不缓存：之后的调用重新计算
+    coalescer.run('key', compute)
+    assert len(calls) == 2
+
+
+def test_stale_generation_is_miss_and_keeps_cache():
+    # 提交前读到旧代数的并发请求不能清空（或写入）新代数的缓存
+    cache = ResultCache()
+    cache.put('a', 2, 'new')
+    assert cache.get('a', 1) is None
+    cache.put('b', 1, 'stale')
+    assert cache.get('a', 2) == 'new'
+    assert cache.get('b', 2) is None
+    stats = cache.stats()
+    assert stats['invalidations'] == 0
+    assert stats['entries'] == 1
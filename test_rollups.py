@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+rollups 的单元测试：各导入、补录和删除路径增量维护的汇总表，
+必须与 rollups.rebuild 按明细表重新计算的结果一致
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import rollups
+from 测试API环境 import clear_database, delete_reports
+from 测试API环境 import parse_xml_to_sqlite as ingest
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_report_api', 'testReports')
+
+# 明细表和元数据表，其余的表都是汇总表
+DETAIL_TABLES = ('test_reports', 'test_info', 'measurements', 'rollup_meta')
+
+
+def _sketch_summary(row):
+    # 分位数草图的压缩是随机的，只比较样本数和最值
+    name, part_number, sketch = row
+    data = json.loads(sketch)
+    return name, part_number, data['count'], data['min'], data['max']
+
+
+# 与导入顺序有关、无法逐行比较的汇总表：表名 -> 行的规范化函数
+NORMALIZERS = {
+    'measurement_sketches': _sketch_summary,
+}
+
+
+def _value(value):
+    # 浮点累加顺序不同会有舍入误差
+    if isinstance(value, float):
+        return float(f'{value:.9g}')
+    return value
+
+
+def _derived_tables(cursor):
+    """
+    返回全部汇总表；全文索引只比较虚拟表本身，不比较其内部表
+    """
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    tables = cursor.fetchall()
+    virtual = [name for name, sql in tables if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+    return {
+        name: name in virtual
+        for name, _ in tables
+        if name not in DETAIL_TABLES and not any(name.startswith(f'{table}_') for table in virtual)
+    }
+
+
+def snapshot(conn):
+    """
+    汇总表全部内容（虚拟表带 rowid，rowid 即明细表ID）
+    """
+    cursor = conn.cursor()
+    result = {}
+    for table, is_virtual in _derived_tables(cursor).items():
+        cursor.execute(f"SELECT {'rowid, ' if is_virtual else ''}* FROM {table}")
+        normalize = NORMALIZERS.get(table, tuple)
+        result[table] = sorted((normalize(tuple(_value(v) for v in row)) for row in cursor.fetchall()), key=repr)
+    return result
+
+
+def assert_matches_rebuild(conn):
+    incremental = snapshot(conn)
+    fingerprint = rollups._stored_fingerprint(conn.cursor())
+    rollups.rebuild(conn)
+    assert incremental == snapshot(conn)
+    assert fingerprint == rollups._report_fingerprint(conn.cursor())
+
+
+def _run_import(directory):
+    """
+    在 directory 中运行 parse_xml_to_sqlite 的导入流程（testReports -> test_reports.sqlite）
+    """
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        ingest.main()
+    finally:
+        os.chdir(cwd)
+    return sqlite3.connect(os.path.join(directory, 'test_reports.sqlite'))
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    shutil.copytree(REPORT_DIR, tmp_path / 'testReports')
+    return str(tmp_path)
+
+
+def test_import_matches_rebuild(workdir):
+    conn = _run_import(workdir)
+    assert conn.execute('SELECT COUNT(*) FROM test_reports').fetchone()[0] == len(os.listdir(REPORT_DIR))
+    assert_matches_rebuild(conn)
+
+
+def test_backfill_matches_rebuild(workdir):
+    # 先只导入部分报告的基本信息（没有测试信息和测量数据），再由导入流程补录
+    conn, cursor = ingest.create_database(os.path.join(workdir, 'test_reports.sqlite'))
+    for filename in sorted(os.listdir(REPORT_DIR))[:5]:
+        parsed = ingest.parse_xml_file(os.path.join(REPORT_DIR, filename))
+        report_id = ingest.insert_test_report(cursor, parsed)
+        rollups.apply_report(cursor, report_id)
+    conn.commit()
+    conn.close()
+
+    conn = _run_import(workdir)
+    assert conn.execute('SELECT COUNT(DISTINCT report_id) FROM test_info').fetchone()[0] == len(os.listdir(REPORT_DIR))
+    assert_matches_rebuild(conn)
+
+
+def test_delete_reports_matches_rebuild(workdir, monkeypatch):
+    conn = _run_import(workdir)
+    conn.close()
+    monkeypatch.setattr(delete_reports, 'db_path', os.path.join(workdir, 'test_reports.sqlite'))
+    delete_reports.delete_reports(3, 7)
+
+    conn = sqlite3.connect(os.path.join(workdir, 'test_reports.sqlite'))
+    assert conn.execute('SELECT COUNT(*) FROM test_reports WHERE id BETWEEN 3 AND 7').fetchone()[0] == 0
+    assert_matches_rebuild(conn)
+
+
+def test_clear_database_empties_rollups(workdir):
+    conn = _run_import(workdir)
+    conn.close()
+    assert clear_database.clear_database(os.path.join(workdir, 'test_reports.sqlite'))
+
+    conn = sqlite3.connect(os.path.join(workdir, 'test_reports.sqlite'))
+    assert all(not rows for rows in snapshot(conn).values())
+    assert rollups._stored_fingerprint(conn.cursor()) == (0, 0)
+
+
+def test_ensure_ready_rebuilds_after_direct_delete(workdir):
+    conn = _run_import(workdir)
+    conn.execute('DELETE FROM measurements WHERE report_id = (SELECT MAX(id) FROM test_reports)')
+    conn.execute('DELETE FROM test_info WHERE report_id = (SELECT MAX(id) FROM test_reports)')
+    conn.execute('DELETE FROM test_reports WHERE id = (SELECT MAX(id) FROM test_reports)')
+    conn.commit()
+
+    rollups.ensure_ready(conn)
+    assert_matches_rebuild(conn)
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+"""
+simple_api_server 的接口测试：在示例数据库的副本上检查分页游标、总数计算方式、流式导出、按列返回等行为
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import pytest
+
+import rollups
+import simple_api_server as server
+
+SAMPLE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_report_api', 'test_reports.sqlite')
+
+
+@pytest.fixture(scope='session')
+def prepared_db(tmp_path_factory):
+    """
+    示例数据库副本，汇总表已就绪
+    """
+    path = str(tmp_path_factory.mktemp('template') / 'test_reports.sqlite')
+    shutil.copy(SAMPLE_DB, path)
+    conn = sqlite3.connect(path)
+    rollups.ensure_ready(conn)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def db_path(prepared_db, tmp_path, monkeypatch):
+    path = str(tmp_path / 'test_reports.sqlite')
+    shutil.copy(prepared_db, path)
+    monkeypatch.setattr(server, 'DATABASE', path)
+    monkeypatch.setattr(server, '_rollups_ready', True)
+    return path
+
+
+@pytest.fixture
+def client(db_path):
+    return server.app.test_client()
+
+
+def _walk(client, url, key, limit):
+    """
+    从首页开始按 next 游标翻到最后一页，返回全部记录
+    """
+    items = []
+    page_cursor = ''
+    while page_cursor is not None:
+        response = client.get(f'{url}&limit={limit}&cursor={page_cursor}')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data[key]) <= limit
+        items.extend(data[key])
+        page_cursor = data['next']
+    return items
+
+
+def _sample_name(db_path):
+    conn = sqlite3.connect(db_path)
+    name = conn.execute(
+        'SELECT name FROM measurements GROUP BY name HAVING COUNT(*) > 20 ORDER BY name LIMIT 1'
+    ).fetchone()[0]
+    conn.close()
+    return name
+
+
+def test_reports_cursor_walks_all_pages(client):
+    expected = [item['id'] for item in client.get('/api/reports?limit=1000').get_json()]
+    walked = [item['id'] for item in _walk(client, '/api/reports?', 'reports', 7)]
+    assert walked == expected
+    assert len(walked) == len(set(walked))
+
+
+def test_measurements_cursor_walks_all_pages(client, db_path):
+    name = _sample_name(db_path)
+    expected = client.get(f'/api/measurements?name={name}&limit=10000').get_json()['measurements']
+    walked = _walk(client, f'/api/measurements?name={name}', 'measurements', 6)
+    assert walked == expected
+
+
+def test_by_name_cursor_walks_all_pages(client, db_path):
+    name = _sample_name(db_path)
+    expected = client.get(f'/api/measurements/by-name/{name}?limit=10000').get_json()['measurements']
+    walked = _walk(client, f'/api/measurements/by-name/{name}?', 'measurements', 6)
+    assert walked == expected
+
+
+def test_by_name_cursor_keeps_rows_without_date(client, db_path):
+    # 日期为空的报告排在最后，翻页经过有日期和无日期的边界时不能丢失记录
+    conn = sqlite3.connect(db_path)
+    for date in ('20250101', None, '20250102', None):
+        report_id = conn.execute(
+            "INSERT INTO test_reports (filename, date, result) VALUES (?, ?, 'Pass')",
+            (f'null-date-{date}-{os.urandom(4).hex()}', date)
+        ).lastrowid
+        for _ in range(2):
+            conn.execute(
+                "INSERT INTO measurements (report_id, name, status) VALUES (?, 'NULL_DATE_ITEM', 'PASS')",
+                (report_id,)
+            )
+    conn.commit()
+    conn.close()
+
+    walked = _walk(client, '/api/measurements/by-name/NULL_DATE_ITEM?', 'measurements', 1)
+    assert len(walked) == 8
+    assert [item['date'] for item in walked] == ['20250102'] * 2 + ['20250101'] * 2 + [None] * 4
+    keys = [(item['report_id'], item['id']) for item in walked[4:]]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.parametrize('url, values', [
+    ('/api/reports?cursor={}', [True]),
+    ('/api/reports?cursor={}', ['1']),
+    ('/api/measurements?cursor={}', [1.5]),
+    ('/api/measurements/by-name/X?cursor={}', [1, 2, 3]),
+    ('/api/measurements/by-name/X?cursor={}', ['20250101', 1]),
+])
+def test_invalid_cursor_rejected(client, url, values):
+    response = client.get(url.format(server._encode_cursor(values)))
+    assert response.status_code == 400
+    assert client.get(url.format('not-a-cursor')).status_code == 400
+
+
+def _exact_count(db_path, where='', params=()):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute(f'SELECT COUNT(*) FROM measurements {where}', params).fetchone()[0]
+    conn.close()
+    return count
+
+
+@pytest.mark.parametrize('query, where', [
+    ('', ''),
+    ('status=PASS', "WHERE status = 'PASS'"),
+    ('status=FAIL', "WHERE status = 'FAIL'"),
+])
+def test_count_modes_agree(client, db_path, query, where):
+    expected = _exact_count(db_path, where)
+    for mode in ('exact', 'estimated', 'cached'):
+        data = client.get(f'/api/measurements?{query}&count={mode}&limit=1').get_json()
+        assert (data['total'], data['total_mode']) == (expected, mode)
+
+
+def test_estimated_count_falls_back_to_exact(client, db_path):
+    # measurement_stats 只分别统计 PASS 和 FAIL，其它状态和按报告过滤都退回精确计数
+    data = client.get('/api/measurements?status=pass&count=estimated&limit=1').get_json()
+    assert (data['total'], data['total_mode']) == (_exact_count(db_path, "WHERE status = 'pass'"), 'exact')
+    data = client.get('/api/measurements?report_id=1&count=estimated&limit=1').get_json()
+    assert (data['total'], data['total_mode']) == (_exact_count(db_path, 'WHERE report_id = 1'), 'exact')
+
+
+def test_by_name_count_modes(client, db_path):
+    name = _sample_name(db_path)
+    expected = _exact_count(db_path, 'WHERE name = ?', (name,))
+    for mode in ('exact', 'estimated', 'cached'):
+        data = client.get(f'/api/measurements/by-name/{name}?count={mode}&limit=1').get_json()
+        assert (data['total'], data['total_mode']) == (expected, mode)
+
+
+def test_invalid_count_mode(client):
+    assert client.get('/api/measurements?count=fast').status_code == 400
+
+
+def test_export_streams_all_matching_rows(client, db_path):
+    name = _sample_name(db_path)
+    expected = _exact_count(db_path, 'WHERE name = ?', (name,))
+
+    response = client.get(f'/api/measurements?name={name}&format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == expected
+    assert all(json.loads(line)['name'] == name for line in lines)
+
+    response = client.get(f'/api/measurements?name={name}&format=csv&fields=id,name')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['id', 'name'] and len(rows) == expected + 1
+
+
+def test_export_gzip_and_empty_result(client):
+    response = client.get('/api/measurements?name=NO_SUCH_ITEM&format=csv&fields=id', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()).decode('utf-8').strip() == 'id'
+
+
+def test_export_closes_connection_without_streaming(db_path):
+    # 客户端在读取响应体之前断开：关闭响应时必须关闭导出占用的数据库连接
+    with server.app.test_request_context('/api/measurements?format=ndjson'):
+        connection = server.get_db()
+        response = server.get_measurements()
+        response.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute('SELECT 1')
+
+
+def _rows_from_columnar(data):
+    """
+    将 columnar 响应还原为逐行对象
+    """
+    rows = [{} for _ in range(data['count'])]
+    for column, values in data['columns'].items():
+        for row, value in zip(rows, values):
+            row[column] = value
+    for row in rows:
+        row.update(data['constants'])
+    return rows
+
+
+def test_columnar_matches_json(client, db_path):
+    name = _sample_name(db_path)
+    url = f'/api/measurements/by-name/{name}?limit=30'
+    expected = client.get(url).get_json()
+    data = client.get(f'{url}&format=columnar').get_json()
+
+    assert 'measurements' not in data
+    assert data['constants']['name'] == name
+    assert (data['total'], data['next']) == (expected['total'], expected['next'])
+    assert _rows_from_columnar(data) == expected['measurements']
+
+
+def test_columnar_empty_page(client):
+    data = client.get('/api/measurements/by-name/NO_SUCH_ITEM?format=columnar').get_json()
+    assert (data['count'], data['constants'], data['next']) == (0, {}, None)
+    assert all(values == [] for values in data['columns'].values())
+
+
+def test_report_batch_returns_reports_in_request_order(client):
+    ids = [item['id'] for item in client.get('/api/reports?limit=3').get_json()]
+    data = client.post('/api/reports/batch', json={'report_ids': ids[::-1] + [ids[0], 999999]}).get_json()
+    assert [item['report']['id'] for item in data['reports']] == ids[::-1]
+    assert data['missing'] == [999999]
+
+
+@pytest.mark.parametrize('body', [
+    {'report_ids': [1, True]},
+    {'report_ids': [1.5]},
+    {'report_ids': ['3']},
+    {'report_ids': [None]},
+    {'report_ids': [1], 'include_test_info': 'false'},
+])
+def test_report_batch_rejects_invalid_body(client, body):
+    assert client.post('/api/reports/batch', json=body).status_code == 400
+
+
+def test_report_detail_cached_with_etag(client, db_path):
+    report_id = client.get('/api/reports?limit=1').get_json()[0]['id']
+    first = client.get(f'/api/reports/{report_id}')
+    assert first.status_code == 200 and first.headers['ETag']
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM report_detail_cache WHERE report_id = ?', (report_id,)).fetchone()[0] == 1
+    conn.close()
+
+    assert client.get(f'/api/reports/{report_id}').get_json() == first.get_json()
+    response = client.get(f'/api/reports/{report_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_report_detail_does_not_wait_for_write_lock(client, db_path):
+    # 导入等写操作持有写锁时，详情照常返回（不等待 busy_timeout），只是不写入缓存
+    report_id = client.get('/api/reports?limit=1').get_json()[0]['id']
+    writer = sqlite3.connect(db_path)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        started = time.monotonic()
+        response = client.get(f'/api/reports/{report_id}')
+        assert response.status_code == 200
+        assert time.monotonic() - started < 1
+    finally:
+        writer.rollback()
+    assert writer.execute('SELECT COUNT(*) FROM report_detail_cache').fetchone()[0] == 0
+    writer.close()
+
+
+def test_report_lookup_orders_exact_prefix_substring(client, db_path):
+    conn = sqlite3.connect(db_path)
+    serial = conn.execute('SELECT serial_number FROM test_reports WHERE serial_number IS NOT NULL LIMIT 1').fetchone()[0]
+    conn.close()
+    data = client.get(f'/api/reports/lookup?q={serial[:-1]}&field=serial_number&limit=100').get_json()
+    matches = [item['match'] for item in data['reports']]
+    assert matches == sorted(matches, key=['exact', 'prefix', 'substring'].index)
+    assert all(serial[:-1] in item['serial_number'] for item in data['reports'])
+    assert client.get(f'/api/reports/lookup?q={serial}').get_json()['reports'][0]['match'] == 'exact'
+
+
+def test_report_lookup_prefix_ending_in_max_code_point(client):
+    for q in ('1M\U0010ffff', '\U0010ffff\U0010ffff', '1M퟿'):
+        assert client.get('/api/reports/lookup', query_string={'q': q}).status_code == 200
+
+
+def test_catalog_counts_match_detail_tables(client, db_path):
+    data = client.get('/api/catalog').get_json()
+    conn = sqlite3.connect(db_path)
+    expected = dict(conn.execute(
+        "SELECT part_number, COUNT(*) FROM test_reports WHERE part_number != '' GROUP BY part_number"
+    ).fetchall())
+    sites = dict(conn.execute(
+        "SELECT tester_site, COUNT(DISTINCT report_id) FROM test_info WHERE tester_site != '' GROUP BY tester_site"
+    ).fetchall())
+    conn.close()
+    assert {item['value']: item['count'] for item in data['part_numbers']} == expected
+    assert {item['value']: item['count'] for item in data['sites']} == sites
+
+    data = client.get('/api/catalog?kind=testers').get_json()
+    assert list(data) == ['testers']
+    assert client.get('/api/catalog?kind=colors').status_code == 400
+
+
+def test_query_budget_aborts_long_query(client, monkeypatch):
+    monkeypatch.setitem(server.QUERY_TIME_BUDGETS, 'get_measurements', 0)
+    response = client.get('/api/measurements?count=exact&status=pass')
+    assert response.status_code == 503
+    assert response.get_json()['budget'] == 0
+    assert response.headers['Retry-After']
+
+
+def test_query_budget_starts_when_query_runs(db_path, monkeypatch):
+    # 请求开始后的等待（合并请求、共享缓存）不计入预算
+    monkeypatch.setitem(server.QUERY_TIME_BUDGETS, 'get_measurements', 0.2)
+    with server.app.test_request_context('/api/measurements'):
+        server.app.preprocess_request()
+        time.sleep(0.3)
+        assert server.get_db().execute("SELECT COUNT(*) FROM measurements WHERE status != ''").fetchone()[0] > 0
+
+
+def test_other_database_errors_return_json_500(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'DATABASE', str(tmp_path / 'empty.sqlite'))
+    response = client.get('/api/reports')
+    assert response.status_code == 500
+    assert 'no such table' in response.get_json()['error']
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+typeahead 的单元测试：前缀/子串查询、部件号过滤和按数据代数刷新
+"""
+
+import sqlite3
+
+import rollups
+from typeahead import TypeaheadIndex
+
+STATS = [
+    ('TX1_EVM', 'P1', 10),
+    ('TX1_EVM', 'P2', 5),
+    ('TX1_Power', 'P1', 7),
+    ('tx2_evm', 'P2', 3),
+    ('RX_Sens', 'P1', 4),
+    ('Power_TX', 'P1', 2),
+]
+
+
+def _index(rows=STATS, generation=1):
+    conn = sqlite3.connect(':memory:')
+    conn.execute(rollups.MEASUREMENT_STATS_TABLE)
+    conn.executemany(
+        'INSERT INTO measurement_stats (name, part_number, total_count) VALUES (?, ?, ?)', rows
+    )
+    index = TypeaheadIndex()
+    index.refresh(conn.cursor(), generation)
+    return index, conn
+
+
+def _names(result):
+    return [item['name'] for item in result['names']]
+
+
+def test_prefix_lookup_is_case_insensitive():
+    index, _ = _index()
+    result = index.query('tx', prefix=True)
+    assert _names(result) == ['TX1_EVM', 'TX1_Power', 'tx2_evm']
+    assert result['names'][0]['count'] == 15
+    assert result['part_numbers'] == ['P1', 'P2']
+
+
+def test_prefix_lookup_boundaries():
+    index, _ = _index()
+    assert _names(index.query('TX1_', prefix=True)) == ['TX1_EVM', 'TX1_Power']
+    assert _names(index.query('TX1_EVM', prefix=True)) == ['TX1_EVM']
+    assert _names(index.query('TX1_EVMX', prefix=True)) == []
+    assert _names(index.query('zz', prefix=True)) == []
+
+
+def test_substring_lookup():
+    index, _ = _index()
+    assert _names(index.query('tx')) == ['Power_TX', 'TX1_EVM', 'TX1_Power', 'tx2_evm']
+
+
+def test_part_number_and_name_filters():
+    index, _ = _index()
+    result = index.query('tx', part_number='P2', prefix=True)
+    assert result['names'] == [{'name': 'TX1_EVM', 'count': 5}, {'name': 'tx2_evm', 'count': 3}]
+    assert result['part_numbers'] == ['P2']
+    assert _names(index.query(name='RX_Sens')) == ['RX_Sens']
+    assert _names(index.query('tx', name='RX_Sens')) == []
+
+
+def test_refresh_only_on_generation_change():
+    index, conn = _index()
+    conn.execute("INSERT INTO measurement_stats (name, part_number, total_count) VALUES ('TX3', 'P1', 1)")
+    index.refresh(conn.cursor(), 1)
+    assert 'TX3' not in _names(index.query('tx', prefix=True))
+    index.refresh(conn.cursor(), 2)
+    assert 'TX3' in _names(index.query('tx', prefix=True))
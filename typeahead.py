@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试项名称的内存输入提示（typeahead）索引
+
+从 measurement_stats 汇总表一次性读取所有 (测试项名称, 部件号, 记录数)，
+在内存中按名称排序保存：前缀查询用二分查找，子串查询顺序扫描小写名称列表，
+都不访问数据库。数据代数变化（有新导入）时重新加载。
+"""
+
+import bisect
+import threading
+
+
+class TypeaheadIndex:
+    """
+    (name, part_number, count) 的内存索引，结果结构与 /api/measurements/names 一致
+    """
+
+    def __init__(self):
+        self.generation = None
+        self._lock = threading.Lock()
+        # (names, lower, by_lower)，整体替换，查询时无需加锁：
+        # - names: 按名称排序的 (name, {part_number: count})
+        # - lower: 小写名称，与 names 下标对应
+        # - by_lower: 按小写名称排序的 (小写名称, 下标)，用于前缀二分查找
+        self._data = ([], [], [])
+
+    def refresh(self, cursor, generation):
+        """
+        数据代数变化时从 measurement_stats 重新加载
+        """
+        if generation == self.generation:
+            return
+        with self._lock:
+            if generation == self.generation:
+                return
+            cursor.execute('''
+            SELECT name, part_number, total_count FROM measurement_stats
+            WHERE name IS NOT NULL AND name != ''
+            ORDER BY name
+            ''')
+            names = []
+            for name, part_number, count in cursor.fetchall():
+                if not names or names[-1][0] != name:
+                    names.append((name, {}))
+                names[-1][1][part_number] = count
+            lower = [name.lower() for name, _ in names]
+            by_lower = sorted((text, idx) for idx, text in enumerate(lower))
+            self._data = (names, lower, by_lower)
+            self.generation = generation
+
+    @staticmethod
+    def _candidates(data, q, prefix):
+        names, lower, by_lower = data
+        if not q:
+            return range(len(names))
+        needle = q.lower()
+        if prefix:
+            indexes = []
+            pos = bisect.bisect_left(by_lower, (needle,))
+            while pos < len(by_lower) and by_lower[pos][0].startswith(needle):
+                indexes.append(by_lower[pos][1])
+                pos += 1
+            # 按名称原文顺序返回
+            return sorted(indexes)
+        return [idx for idx, text in enumerate(lower) if needle in text]
+
+    def query(self, q=None, part_number=None, name=None, prefix=False):
+        """
+        返回 {'total', 'names': [{'name', 'count'}], 'part_numbers'}
+
+        - q: 名称包含 q（prefix=True 时为以 q 开头），不区分大小写
+        - part_number: 只统计该部件号
+        - name: 只返回该名称
+        """
+        data = self._data
+        names, lower, _ = data
+        if name:
+            idx = bisect.bisect_left(names, (name,))
+            indexes = [idx] if idx < len(names) and names[idx][0] == name else []
+            if q:
+                needle = q.lower()
+                indexes = [
+                    i for i in indexes
+                    if (lower[i].startswith(needle) if prefix else needle in lower[i])
+                ]
+        else:
+            indexes = self._candidates(data, q, prefix)
+
+        result = []
+        part_numbers = set()
+        for idx in indexes:
+            item_name, parts = names[idx]
+            if part_number:
+                count = parts.get(part_number)
+                if count is None:
+                    continue
+            else:
+                count = sum(parts.values())
+            result.append({'name': item_name, 'count': count})
+            if part_number:
+                part_numbers.add(part_number)
+            else:
+                part_numbers.update(part for part in parts if part)
+
+        return {
+            'total': len(result),
+            'names': result,
+            'part_numbers': sorted(part_numbers)
+        }
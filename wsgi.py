@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""
+生产环境 WSGI 入口
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+导入时（preload 模式下在主进程中、fork 工作进程之前执行一次）把数据库切换为 WAL 模式
+并准备好汇总表，工作进程启动后不再各自检查/重建汇总表。
+"""
+
+import sqlite3
+
+import rollups
+import simple_api_server
+from simple_api_server import app
+
+
+def prepare(database=None):
+    """
+    准备数据库：WAL 模式（多个进程读取时不被写入阻塞）并确保汇总表就绪。
+    使用独立连接并在返回前关闭，不把连接带入 fork 出的工作进程
+    """
+    conn = sqlite3.connect(database or simple_api_server.DATABASE)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        rollups.ensure_ready(conn)
+    finally:
+        conn.close()
+    simple_api_server._rollups_ready = True
+
+
+prepare()
+
+__all__ = ['app']
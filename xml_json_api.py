@@ -4,9 +4,12 @@ import sqlite3
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
+import rollups
+
 # 导入现有的解析和数据库函数
 from 测试API环境.parse_xml_to_sqlite import (
     create_database, 
+    check_file_exists,
     insert_test_report, 
     insert_test_info, 
     insert_measurements
@@ -56,6 +59,14 @@ def upload_xml_json():
             'filename_info': data['filename_info']
         }
         
+        # 与主服务的上传接口一致：已存在同名文件时跳过，不向已有报告追加数据
+        if check_file_exists(cursor, report['filename'].replace('.xml', '')):
+            conn.close()
+            return jsonify({
+                'success': False,
+                'message': f"数据库中已存在同名文件: {report['filename']}，本次跳过导入。"
+            }), 200
+        
         # 插入测试报告信息
         report_id = insert_test_report(cursor, report)
         if report_id is None:
@@ -71,6 +82,9 @@ def upload_xml_json():
         # 插入测量数据
         insert_measurements(cursor, report_id, data['measurements'])
         
+        # 在同一事务内更新汇总表
+        rollups.apply_report(cursor, report_id)
+        
         # 提交事务并关闭连接
         conn.commit()
         conn.close()
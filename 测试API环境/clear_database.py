@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 """
-清空数据库中的所有数据，但保留表结构
+清空数据库中的所有报告数据，但保留表结构（汇总表和搜索索引随之重建为空）
 
 用法：
     python clear_database.py
@@ -17,10 +17,19 @@ import sqlite3
 import argparse
 import shutil
 import datetime
+import sys
+
+# 汇总表模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rollups
 
 # 默认数据库文件
 DEFAULT_DB = 'test_reports.sqlite'
 
+# 明细表；汇总表、搜索索引和元数据表由 rollups.rebuild 按明细表重建，
+# 不能直接逐表清空（全文索引的内部表和数据代数会被破坏）
+DETAIL_TABLES = ('measurements', 'test_info', 'test_reports')
+
 def backup_database(db_file):
     """
     在清空数据库前创建备份
@@ -57,26 +66,30 @@ def clear_database(db_file, create_backup=False):
         # 启用外键约束
         cursor.execute('PRAGMA foreign_keys = OFF')
         
-        # 获取所有表名
+        # 获取存在的明细表
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = cursor.fetchall()
+        tables = [row[0] for row in cursor.fetchall() if row[0] in DETAIL_TABLES]
         
         # 开始事务
         conn.execute('BEGIN TRANSACTION')
         
-        # 清空每个表
-        for table in tables:
-            table_name = table[0]
+        # 清空每个明细表
+        for table_name in tables:
             print(f"清空表: {table_name}")
             cursor.execute(f"DELETE FROM {table_name}")
         
         # 重置自增ID
-        for table in tables:
-            table_name = table[0]
-            cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}'")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence'")
+        if cursor.fetchone():
+            for table_name in tables:
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table_name,))
         
-        # 提交更改
-        conn.commit()
+        # 重建（清空）汇总表和搜索索引并提交更改
+        if 'test_reports' in tables:
+            print("重建汇总表...")
+            rollups.rebuild(conn)
+        else:
+            conn.commit()
         print("所有表已清空，数据库结构保留")
         
         # 重新启用外键约束
@@ -1,5 +1,10 @@
 import sqlite3
 import os
+import sys
+
+# 汇总表模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rollups
 
 # 数据库文件路径
 db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_reports.sqlite')
@@ -44,8 +49,9 @@ def delete_reports(start_id, end_id):
         deleted = cursor.rowcount
         print(f"删除了 {deleted} 条报告数据")
         
-        # 提交事务
-        conn.commit()
+        # 按剩余明细数据重建汇总表，与删除操作在同一事务中提交（同时更新数据代数，使接口缓存失效）
+        print("重建汇总表...")
+        rollups.rebuild(conn)
         print("所有数据已成功删除")
         
     except Exception as e:
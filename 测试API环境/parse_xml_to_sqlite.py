@@ -3,6 +3,11 @@ import xml.etree.ElementTree as ET
 import sqlite3
 import re
 import json
+import sys
+
+# 汇总表模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rollups
 
 def parse_filename(filename):
     """
@@ -264,6 +269,10 @@ def create_database(db_path):
             FOREIGN KEY (report_id) REFERENCES test_reports(id)
         )''')
         
+        # Create rollup tables maintained at ingest
+        rollups.ensure_tables(cursor)
+        conn.commit()
+        
         return conn, cursor
     except Exception as e:
         print(f"Error creating database: {e}")
@@ -524,10 +533,13 @@ def main():
                     # 插入缺少的test_info
                     if not has_test_info:
                         insert_test_info(cursor, report_id, parsed_data['test_info'])
+                        rollups.apply_test_info(cursor, report_id)
                     
                     # 插入缺少的measurements
                     if not has_measurements:
                         insert_measurements(cursor, report_id, parsed_data['measurements'])
+                        # 报告本身已计入汇总表，只累加补录的测量数据
+                        rollups.apply_measurements(cursor, report_id)
                     
                 else:
                     # 新文件，完整处理
@@ -547,6 +559,9 @@ def main():
                         # 插入测量数据
                         insert_measurements(cursor, report_id, parsed_data['measurements'])
                         
+                        # 在同一事务内更新汇总表
+                        rollups.apply_report(cursor, report_id)
+                        
                         new_files += 1
                     else:
                         skipped_files += 1